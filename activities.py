@@ -1,37 +1,745 @@
+import calendar
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
 from extensions import db
+from geo import GEOHASH_PRECISION, covering_cells, geocode, geohash_encode, haversine_km
+from tags import activity_tag, tagged
+
+EXPLORE_PAGE_SIZE = 20
+
+# Explore's "within N km" filter
+EXPLORE_RADII_KM = (1, 2, 5, 10, 20)
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+
+# add_participant() results
+JOINED = "joined"
+ALREADY_JOINED = "already_joined"
+ACTIVITY_FULL = "full"
+OCCURRENCE_CANCELLED = "cancelled"
+
+# Recurrence rule -> days between occurrences; monthly repeats on the same day of the month
+RECURRENCES = {"weekly": 7, "fortnightly": 14, "monthly": None}
+
+SCHEDULE_WINDOW_DAYS = 8 * 7  # how far ahead recurring activities are scheduled
+
+DISPLAY_DATE_FORMAT = "%d %b %Y"
+DISPLAY_TIME_FORMAT = "%I:%M %p"
+
+DATE_FORMATS = ("%Y-%m-%d", "%d %b %Y", "%m/%d/%Y", "%d/%m/%Y")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p")
+
+
+def parse_activity_date(value):
+    """Parse a form or legacy date string into a date; None if it matches no format."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+def parse_activity_time(value):
+    """Parse a form or legacy time string into a time; None if it matches no format."""
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).time()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
 
 class Activity(db.Model):
     __tablename__ = "activity"
+    __table_args__ = (
+        # Upcoming-activity lists filter and sort on date, then time
+        db.Index('ix_activity_date_time', 'date', 'time'),
+        # Explore filters on one facet and sorts by start; these also cover the facet counts
+        db.Index('ix_activity_type_date_time', 'type', 'date', 'time'),
+        db.Index('ix_activity_energy_date_time', 'energy', 'date', 'time'),
+        db.Index('ix_activity_format_type_date_time', 'format_type', 'date', 'time'),
+        # Distance search scans geohash prefix ranges
+        db.Index('ix_activity_geohash', 'geohash'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     type = db.Column(db.String(50))
-    date = db.Column(db.String(20))
-    time = db.Column(db.String(10))
+    date = db.Column(db.Date)
+    time = db.Column(db.Time)
     duration_hours = db.Column(db.Integer)
     duration_minutes = db.Column(db.Integer)
     format_type = db.Column(db.String(20))
     energy = db.Column(db.String(10))
     participants = db.Column(db.Integer)
     max_participants = db.Column(db.Integer)
-    tags = db.Column(db.String(200))
     location = db.Column(db.String(100))
+    # Set by locate_activity() when the location is a known place; None otherwise
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(GEOHASH_PRECISION))
+    recurrence = db.Column(db.String(20))  # None, or a key of RECURRENCES
+    recurrence_until = db.Column(db.Date)  # last date a series may fall on; None repeats indefinitely
+    # Bumped on every change, including tags; keys the activity_views display cache
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to User
     creator = db.relationship("User", backref="created_activities")
 
+    # Written through tags.set_activity_tags()
+    tags = db.relationship("Tag", secondary=activity_tag, order_by=activity_tag.c.position,
+                           viewonly=True)
+
+    @property
+    def tag_names(self):
+        return [tag.name for tag in self.tags]
+
+    @property
+    def display_date(self):
+        return self.date.strftime(DISPLAY_DATE_FORMAT) if self.date else ""
+
+    @property
+    def display_time(self):
+        return self.time.strftime(DISPLAY_TIME_FORMAT).lstrip("0") if self.time else ""
+
+    @property
+    def display_recurrence(self):
+        if not self.recurrence:
+            return ""
+        text = f"Repeats {self.recurrence}"
+        if self.recurrence_until:
+            text += f" until {self.recurrence_until.strftime(DISPLAY_DATE_FORMAT)}"
+        return text
+
+
+class ActivityOccurrence(db.Model):
+    """One date of a recurring activity that has state of its own.
+
+    Rows are only created for dates that are cancelled or joined on their
+    own; every other date of a series exists only through expansion.
+    """
+    __tablename__ = "activity_occurrence"
+    __table_args__ = (
+        db.UniqueConstraint('activity_id', 'occurrence_date', name='uq_activity_occurrence_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    participants = db.Column(db.Integer, nullable=False, default=0)  # joined this date only
+
+    activity = db.relationship("Activity", backref="occurrences")
+
 
 class ActivityParticipant(db.Model):
     __tablename__ = "activity_participants"
+    __table_args__ = (
+        # One series-wide row per user per activity; also serves "activities this user joined"
+        db.Index('ix_activity_participants_participant_activity', 'participant_id', 'activity_id',
+                 unique=True, sqlite_where=db.text('occurrence_id IS NULL'),
+                 postgresql_where=db.text('occurrence_id IS NULL')),
+        # And one row per user per single occurrence
+        db.Index('ix_activity_participants_participant_occurrence', 'participant_id', 'occurrence_id',
+                 unique=True, sqlite_where=db.text('occurrence_id IS NOT NULL'),
+                 postgresql_where=db.text('occurrence_id IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     participant_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Set when the user joined one date of a recurring activity instead of the series
+    occurrence_id = db.Column(db.Integer, db.ForeignKey('activity_occurrence.id'), index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     # Relationships
     participant = db.relationship("User", foreign_keys=[participant_id], backref="joined_activities")
     activity = db.relationship("Activity", backref="participants_list")
-    creator = db.relationship("User", foreign_keys=[creator_id])
\ No newline at end of file
+    creator = db.relationship("User", foreign_keys=[creator_id])
+    occurrence = db.relationship("ActivityOccurrence")
+
+
+def activity_start_order():
+    """Soonest first; activities without a date or time go last."""
+    return (Activity.date.asc().nulls_last(), Activity.time.asc().nulls_last(), Activity.id.asc())
+
+
+def encode_activity_cursor(position):
+    """Cursor for a (date, time, id) position in activity_start_order()."""
+    activity_date, activity_time, activity_id = position
+    return "|".join((
+        activity_date.isoformat() if activity_date else "",
+        activity_time.isoformat() if activity_time else "",
+        str(activity_id),
+    ))
+
+
+def decode_activity_cursor(cursor):
+    """Parse a cursor from encode_activity_cursor(); raises ValueError if malformed."""
+    date_str, time_str, activity_id = cursor.split("|")
+    return (
+        date.fromisoformat(date_str) if date_str else None,
+        time.fromisoformat(time_str) if time_str else None,
+        int(activity_id),
+    )
+
+
+def _after_nulls_last(column, value):
+    # Strictly after value in ascending order with NULLs sorted last
+    if value is None:
+        return db.false()
+    return (column > value) | column.is_(None)
+
+
+def _same(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def start_order_key(position):
+    """Sort key for a (date, time, id) position, matching activity_start_order()."""
+    activity_date, activity_time, activity_id = position
+    return (activity_date is None, activity_date or date.min,
+            activity_time is None, activity_time or time.min, activity_id)
+
+
+def after_activity_position(position):
+    """Filter for activities strictly after a (date, time, id) position."""
+    activity_date, activity_time, activity_id = position
+    return _after_nulls_last(Activity.date, activity_date) | (
+        _same(Activity.date, activity_date) & (
+            _after_nulls_last(Activity.time, activity_time) |
+            (_same(Activity.time, activity_time) & (Activity.id > activity_id))
+        )
+    )
+
+
+def locate_activity(activity):
+    """Set an activity's coordinates from its location through the gazetteer.
+
+    Online activities and unknown places are left without coordinates.
+    Returns True if the activity was located.
+    """
+    point = None
+    if (activity.format_type or "").lower() != "online":
+        point = geocode(activity.location)
+    if point is None:
+        activity.latitude = activity.longitude = activity.geohash = None
+        return False
+    activity.latitude, activity.longitude = point
+    activity.geohash = geohash_encode(*point)
+    return True
+
+
+def activities_within(latitude, longitude, radius_km):
+    """{activity id: distance in km} for located activities within radius_km.
+
+    The covering geohash cells are index range scans; only the candidates
+    found in them get an exact distance.
+    """
+    in_cells = db.or_(*(
+        (Activity.geohash >= cell) & (Activity.geohash < cell + "~")
+        for cell in covering_cells(latitude, longitude, radius_km)
+    ))
+    distances = {}
+    for activity_id, activity_latitude, activity_longitude in db.session.query(
+        Activity.id, Activity.latitude, Activity.longitude
+    ).filter(in_cells):
+        distance = haversine_km(latitude, longitude, activity_latitude, activity_longitude)
+        if distance <= radius_km:
+            distances[activity_id] = distance
+    return distances
+
+
+def encode_distance_cursor(position):
+    """Cursor for a (distance, id) position in get_nearby_page() order."""
+    distance, activity_id = position
+    return f"{distance!r}|{activity_id}"
+
+
+def decode_distance_cursor(cursor):
+    """Parse a cursor from encode_distance_cursor(); raises ValueError if malformed."""
+    distance, activity_id = cursor.split("|")
+    return float(distance), int(activity_id)
+
+
+# Explore facets: query-string name -> column
+EXPLORE_FACETS = {
+    'category': Activity.type,
+    'energy': Activity.energy,
+    'format': Activity.format_type,
+}
+
+
+def has_tag(name):
+    """Filter for activities tagged exactly name."""
+    return tagged(activity_tag, "activity_id", Activity.id, name)
+
+
+def explore_filters(search=None, tag=None, near=None, **facets):
+    """Explore filter conditions keyed by 'search', 'tag', 'near' and facet name.
+
+    near is an activities_within() result, or None for no distance filter.
+
+    Keeping them keyed lets explore_facet_counts() leave each facet's own
+    filter out of its counts.
+    """
+    filters = {}
+    if search:
+        filters['search'] = (
+            Activity.name.ilike(f"%{search}%") |
+            Activity.type.ilike(f"%{search}%") |
+            has_tag(search)
+        )
+    if tag:
+        filters['tag'] = has_tag(tag)
+    if near is not None:
+        filters['near'] = Activity.id.in_(list(near))
+    for name, column in EXPLORE_FACETS.items():
+        if facets.get(name):
+            filters[name] = column == facets[name]
+    return filters
+
+
+def get_explore_page(filters, after=None, limit=EXPLORE_PAGE_SIZE, today=None):
+    """One page of explore results after an optional cursor position.
+
+    Activities are ordered and paged by the date they are shown at: one-off
+    activities by their date, through the index, and recurring ones by
+    their next date. That date moves on every day, so matching series are
+    placed in Python and merged in. Returns (activities, next_cursor);
+    next_cursor is None on the last page.
+    """
+    today = today or date.today()
+
+    query = Activity.query.filter(*filters.values(), Activity.recurrence.is_(None))
+    if after is not None:
+        query = query.filter(after_activity_position(after))
+    positions = [
+        ((activity.date, activity.time, activity.id), activity)
+        for activity in query.order_by(*activity_start_order()).limit(limit + 1)
+    ]
+
+    series = Activity.query.filter(*filters.values(), Activity.recurrence.isnot(None)).all()
+    upcoming = next_occurrences(series, today)
+    for activity in series:
+        shown = upcoming[activity.id].date if activity.id in upcoming else activity.date
+        position = (shown, activity.time, activity.id)
+        if after is None or start_order_key(position) > start_order_key(after):
+            positions.append((position, activity))
+
+    positions.sort(key=lambda entry: start_order_key(entry[0]))
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    next_cursor = encode_activity_cursor(positions[-1][0]) if has_more else None
+    return [activity for _, activity in positions], next_cursor
+
+
+def get_nearby_page(filters, distances, after=None, limit=EXPLORE_PAGE_SIZE):
+    """Like get_explore_page(), but nearest first.
+
+    distances is the activities_within() result the filters were built
+    with, and after an optional (distance, id) cursor position. Only the
+    ids of the matches are fetched to sort them; rows are loaded for the
+    page alone.
+    """
+    positions = sorted(
+        (distances[activity_id], activity_id)
+        for (activity_id,) in db.session.query(Activity.id).filter(*filters.values())
+    )
+    if after is not None:
+        positions = positions[bisect_right(positions, after):]
+
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    by_id = {}
+    if positions:
+        by_id = {a.id: a for a in Activity.query.filter(Activity.id.in_([i for _, i in positions]))}
+    activities = [by_id[activity_id] for _, activity_id in positions]
+    next_cursor = encode_distance_cursor(positions[-1]) if has_more else None
+    return activities, next_cursor
+
+
+def explore_facet_counts(filters):
+    """Counts per value of each explore facet, in one UNION ALL query.
+
+    Each facet is counted under every filter except its own, so a chip
+    shows how many results choosing it would give. Returns
+    {facet: {value: count}}.
+    """
+    selects = [
+        db.select(db.literal(name).label('facet'), column.label('value'), db.func.count().label('total'))
+        .where(*(condition for key, condition in filters.items() if key != name))
+        .group_by(column)
+        for name, column in EXPLORE_FACETS.items()
+    ]
+    counts = {name: {} for name in EXPLORE_FACETS}
+    for facet, value, total in db.session.execute(db.union_all(*selects)):
+        counts[facet][value] = total
+    return counts
+
+
+def add_participant(activity, user_id):
+    """Join user_id to an activity in one transaction.
+
+    The place is taken with a conditional UPDATE, so concurrent joins can
+    neither lose a count nor go past max_participants. A series join
+    counts towards every upcoming date, so it also needs a place on the
+    date with the most single-date joins. Dates the user had joined on
+    their own are folded into the series join, so they are not counted
+    twice. Returns JOINED, ALREADY_JOINED or ACTIVITY_FULL. Commits or
+    rolls back.
+    """
+    activity_id, creator_id = activity.id, activity.creator_id
+    try:
+        # The insert takes the write lock; the unique index rejects a second join
+        db.session.execute(db.insert(ActivityParticipant).values(
+            participant_id=user_id, activity_id=activity_id, creator_id=creator_id
+        ))
+    except IntegrityError:
+        db.session.rollback()
+        return ALREADY_JOINED
+
+    single_dates = db.session.execute(
+        db.select(ActivityParticipant.occurrence_id).where(
+            ActivityParticipant.participant_id == user_id,
+            ActivityParticipant.activity_id == activity_id,
+            ActivityParticipant.occurrence_id.isnot(None),
+        )
+    ).scalars().all()
+    if single_dates:
+        db.session.execute(
+            db.delete(ActivityParticipant)
+            .where(ActivityParticipant.participant_id == user_id,
+                   ActivityParticipant.occurrence_id.in_(single_dates))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.update(ActivityOccurrence)
+            .where(ActivityOccurrence.id.in_(single_dates), ActivityOccurrence.participants > 0)
+            .values(participants=ActivityOccurrence.participants - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    busiest_date = (
+        db.select(db.func.coalesce(db.func.max(ActivityOccurrence.participants), 0))
+        .where(ActivityOccurrence.activity_id == activity_id, ActivityOccurrence.occurrence_date >= date.today())
+        .scalar_subquery()
+    )
+    taken = db.session.execute(
+        db.update(Activity)
+        .where(Activity.id == activity_id, Activity.participants + busiest_date < Activity.max_participants)
+        .values(participants=Activity.participants + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not taken:
+        db.session.rollback()
+        return ACTIVITY_FULL
+
+    db.session.commit()
+    return JOINED
+
+
+def remove_participant(activity, user_id):
+    """Remove user_id from an activity (a whole series) in one transaction; False if they had not joined.
+
+    Commits.
+    """
+    activity_id = activity.id
+    removed = db.session.execute(
+        db.delete(ActivityParticipant)
+        .where(ActivityParticipant.participant_id == user_id, ActivityParticipant.activity_id == activity_id,
+               ActivityParticipant.occurrence_id.is_(None))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if removed:
+        db.session.execute(
+            db.update(Activity)
+            .where(Activity.id == activity_id, Activity.participants > 0)
+            .values(participants=Activity.participants - 1)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return bool(removed)
+
+
+# One date of an activity: a one-off activity is its own single occurrence.
+# occurrence_id, cancelled and participants come from a materialized
+# ActivityOccurrence row; participants counts people who joined only this date.
+Occurrence = namedtuple("Occurrence", ["activity", "date", "occurrence_id", "cancelled", "participants"])
+
+
+def single_occurrence(activity):
+    return Occurrence(activity, activity.date, None, False, 0)
+
+
+def _add_months(day, months):
+    # Same day of the month, clamped to the month's last day
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_dates(activity, start, end):
+    """Yield the dates an activity falls on between start and end, inclusive.
+
+    Only the requested window is expanded, so open-ended series are fine.
+    """
+    first = activity.date
+    if first is None:
+        return
+    if not activity.recurrence:
+        if start <= first <= end:
+            yield first
+        return
+
+    last = min(end, activity.recurrence_until) if activity.recurrence_until else end
+    step = RECURRENCES[activity.recurrence]
+    if step:
+        skipped = max(0, -(-(start - first).days // step))
+        day = first + timedelta(days=skipped * step)
+        while day <= last:
+            yield day
+            day += timedelta(days=step)
+    else:
+        months = max(0, (start.year - first.year) * 12 + start.month - first.month)
+        day = _add_months(first, months)
+        while day <= last:
+            if day >= start:
+                yield day
+            months += 1
+            day = _add_months(first, months)
+
+
+def is_occurrence_date(activity, day):
+    return next(occurrence_dates(activity, day, day), None) is not None
+
+
+def expand_occurrences(activities, start, end, include_cancelled=False):
+    """Occurrences of activities between start and end, soonest first.
+
+    Materialized dates of recurring activities are looked up in one query
+    over the window.
+    """
+    recurring_ids = [activity.id for activity in activities if activity.recurrence]
+    materialized = {}
+    if recurring_ids:
+        rows = ActivityOccurrence.query.filter(
+            ActivityOccurrence.activity_id.in_(recurring_ids),
+            ActivityOccurrence.occurrence_date.between(start, end),
+        )
+        materialized = {(row.activity_id, row.occurrence_date): row for row in rows}
+
+    occurrences = []
+    for activity in activities:
+        for day in occurrence_dates(activity, start, end):
+            row = materialized.get((activity.id, day))
+            if row is None:
+                occurrences.append(Occurrence(activity, day, None, False, 0))
+            elif include_cancelled or not row.cancelled:
+                occurrences.append(Occurrence(activity, day, row.id, row.cancelled, row.participants))
+
+    occurrences.sort(key=occurrence_order)
+    return occurrences
+
+
+def occurrence_order(occurrence):
+    """Sort key putting occurrences soonest first."""
+    return occurrence.date, occurrence.activity.time or time.max, occurrence.activity.id
+
+
+def next_occurrences(activities, today, horizon_days=366):
+    """{activity id: next Occurrence from today} for recurring activities that have one."""
+    upcoming = {}
+    for occurrence in expand_occurrences([a for a in activities if a.recurrence], today,
+                                         today + timedelta(days=horizon_days)):
+        upcoming.setdefault(occurrence.activity.id, occurrence)
+    return upcoming
+
+
+def materialize_occurrence(activity, day):
+    """The ActivityOccurrence row for one date of a series, created if needed.
+
+    The caller commits.
+    """
+    occurrence = ActivityOccurrence.query.filter_by(activity_id=activity.id, occurrence_date=day).first()
+    if occurrence is None:
+        try:
+            with db.session.begin_nested():
+                occurrence = ActivityOccurrence(activity_id=activity.id, occurrence_date=day)
+                db.session.add(occurrence)
+        except IntegrityError:
+            # Materialized by a concurrent request
+            occurrence = ActivityOccurrence.query.filter_by(activity_id=activity.id, occurrence_date=day).one()
+    return occurrence
+
+
+def set_occurrence_cancelled(activity, day, cancelled=True):
+    """Cancel or restore one date of a series without touching the rest. Commits."""
+    materialize_occurrence(activity, day).cancelled = cancelled
+    activity.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def add_occurrence_participant(activity, day, user_id):
+    """Join user_id to one date of a recurring activity in one transaction.
+
+    Like add_participant(), the place is taken with a conditional UPDATE;
+    series participants count towards every date's capacity. Returns
+    JOINED, ALREADY_JOINED, ACTIVITY_FULL or OCCURRENCE_CANCELLED. Commits
+    or rolls back.
+    """
+    activity_id, creator_id = activity.id, activity.creator_id
+    occurrence = materialize_occurrence(activity, day)
+    if occurrence.cancelled:
+        db.session.rollback()
+        return OCCURRENCE_CANCELLED
+    occurrence_id = occurrence.id
+
+    joined_series = db.session.query(ActivityParticipant.id).filter(
+        ActivityParticipant.participant_id == user_id,
+        ActivityParticipant.activity_id == activity_id,
+        ActivityParticipant.occurrence_id.is_(None),
+    ).first()
+    if joined_series:
+        db.session.rollback()
+        return ALREADY_JOINED
+
+    try:
+        db.session.execute(db.insert(ActivityParticipant).values(
+            participant_id=user_id, activity_id=activity_id, creator_id=creator_id, occurrence_id=occurrence_id
+        ))
+    except IntegrityError:
+        db.session.rollback()
+        return ALREADY_JOINED
+
+    series_participants = db.select(Activity.participants).where(Activity.id == activity_id).scalar_subquery()
+    capacity = db.select(Activity.max_participants).where(Activity.id == activity_id).scalar_subquery()
+    taken = db.session.execute(
+        db.update(ActivityOccurrence)
+        .where(
+            ActivityOccurrence.id == occurrence_id,
+            ActivityOccurrence.cancelled.is_(False),
+            ActivityOccurrence.participants + series_participants < capacity,
+        )
+        .values(participants=ActivityOccurrence.participants + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not taken:
+        db.session.rollback()
+        return ACTIVITY_FULL
+
+    db.session.commit()
+    return JOINED
+
+
+def remove_occurrence_participant(activity, day, user_id):
+    """Remove user_id from one date they joined on its own; False if they had not. Commits."""
+    occurrence_id = db.session.query(ActivityOccurrence.id).filter_by(
+        activity_id=activity.id, occurrence_date=day
+    ).scalar()
+    removed = 0
+    if occurrence_id is not None:
+        removed = db.session.execute(
+            db.delete(ActivityParticipant)
+            .where(ActivityParticipant.participant_id == user_id, ActivityParticipant.occurrence_id == occurrence_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if removed:
+        db.session.execute(
+            db.update(ActivityOccurrence)
+            .where(ActivityOccurrence.id == occurrence_id, ActivityOccurrence.participants > 0)
+            .values(participants=ActivityOccurrence.participants - 1)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return bool(removed)
+
+
+def _schedule_activities(user_id):
+    joined_ids = db.session.query(ActivityParticipant.activity_id).filter(
+        ActivityParticipant.participant_id == user_id
+    )
+    return (Activity.creator_id == user_id) | Activity.id.in_(joined_ids)
+
+
+def user_schedule(user_id, today, window_days=SCHEDULE_WINDOW_DAYS):
+    """(occurrences, join_status) for the dates user_id organises or has joined, from today.
+
+    One-off activities are all included; series are expanded over the next
+    window_days. Cancelled dates are included. join_status(occurrence) is
+    "created", "true" (joined the whole series) or "occurrence" (joined
+    that date only).
+    """
+    participations = (
+        db.session.query(ActivityParticipant.activity_id, ActivityOccurrence.occurrence_date)
+        .outerjoin(ActivityOccurrence, ActivityOccurrence.id == ActivityParticipant.occurrence_id)
+        .filter(ActivityParticipant.participant_id == user_id)
+        .all()
+    )
+    activities = (
+        Activity.query
+        .filter(
+            _schedule_activities(user_id),
+            (Activity.date >= today) | (
+                Activity.recurrence.isnot(None)
+                & (Activity.recurrence_until.is_(None) | (Activity.recurrence_until >= today))
+            ),
+        )
+        .order_by(*activity_start_order())
+        .all()
+    )
+
+    # Series joined as a whole, and single dates joined on their own
+    series_ids = {activity_id for activity_id, day in participations if day is None}
+    joined_dates = {(activity_id, day) for activity_id, day in participations if day is not None}
+
+    # One-off activities are listed as they are; only series are expanded, and
+    # only over the window, however far ahead the last one-off activity is
+    series = [activity for activity in activities if activity.recurrence]
+    one_offs = [single_occurrence(activity) for activity in activities if not activity.recurrence]
+    series_occurrences = [
+        occurrence for occurrence in expand_occurrences(series, today, today + timedelta(days=window_days),
+                                                        include_cancelled=True)
+        if occurrence.activity.creator_id == user_id
+        or occurrence.activity.id in series_ids
+        or (occurrence.activity.id, occurrence.date) in joined_dates
+    ]
+    occurrences = sorted(one_offs + series_occurrences, key=occurrence_order)
+
+    def join_status(occurrence):
+        activity = occurrence.activity
+        if activity.creator_id == user_id:
+            return "created"
+        if activity.id in series_ids:
+            return "true"
+        return "occurrence"
+
+    return occurrences, join_status
+
+
+def schedule_version(user_id):
+    """(last_modified, counts) identifying the current state of user_id's schedule.
+
+    last_modified is the newest change to one of their activities or
+    participations. The counts change when a row is deleted, which leaves
+    no timestamp behind.
+    """
+    activity_changes = db.select(db.func.max(Activity.updated_at), db.func.count(Activity.id)).where(
+        _schedule_activities(user_id)
+    )
+    participant_changes = db.select(
+        db.func.max(ActivityParticipant.created_at), db.func.count(ActivityParticipant.id)
+    ).where(ActivityParticipant.participant_id == user_id)
+
+    activity_updated, activity_count = db.session.execute(activity_changes).one()
+    joined_at, joined_count = db.session.execute(participant_changes).one()
+    last_modified = max([dt for dt in (activity_updated, joined_at) if dt], default=None)
+    return last_modified, (activity_count, joined_count)
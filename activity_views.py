@@ -0,0 +1,122 @@
+"""
+Read-only display objects for activity listings.
+
+The display time, recurrence text and tag list of an activity only change
+when the activity does, so they are built once per version and cached
+under (id, updated_at). Listing views then add the per-occurrence and
+per-request fields (date, days until, join status) and get back
+ActivityView tuples; ORM instances are never modified.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date
+from functools import lru_cache
+
+from extensions import db
+from activities import DISPLAY_DATE_FORMAT, single_occurrence
+from tags import Tag, activity_tag
+
+DISPLAY_CACHE_SIZE = 4096
+
+ActivityView = namedtuple("ActivityView", [
+    "id", "creator_id", "name", "description", "type", "energy", "format_type", "location",
+    "date", "time", "duration_hours", "duration_minutes", "participants", "max_participants",
+    "display_date", "display_time", "tag_names", "days_until", "join_activity",
+    "recurrence", "display_recurrence", "occurrence_date", "cancelled", "distance_km",
+])
+
+_display_cache = OrderedDict()
+_display_lock = threading.Lock()
+
+
+def _load_tag_names(activity_ids):
+    names = {activity_id: [] for activity_id in activity_ids}
+    rows = (
+        db.session.query(activity_tag.c.activity_id, Tag.name)
+        .join(Tag, Tag.id == activity_tag.c.tag_id)
+        .filter(activity_tag.c.activity_id.in_(activity_ids))
+        .order_by(activity_tag.c.activity_id, activity_tag.c.position)
+    )
+    for activity_id, name in rows:
+        names[activity_id].append(name)
+    return names
+
+
+@lru_cache(maxsize=1024)
+def format_display_date(day):
+    return day.strftime(DISPLAY_DATE_FORMAT) if day else ""
+
+
+def display_fields(activities):
+    """{id: (display_time, display_recurrence, tag_names)} for a page of activities.
+
+    Cache misses are built together, with one query for all their tags.
+    """
+    activities = list({activity.id: activity for activity in activities}.values())
+    keys = {activity.id: (activity.id, activity.updated_at) for activity in activities}
+    fields = {}
+    with _display_lock:
+        for activity_id, key in keys.items():
+            if key in _display_cache:
+                _display_cache.move_to_end(key)
+                fields[activity_id] = _display_cache[key]
+
+    missing = [activity for activity in activities if activity.id not in fields]
+    if missing:
+        tag_names = _load_tag_names([activity.id for activity in missing])
+        with _display_lock:
+            for activity in missing:
+                entry = (activity.display_time, activity.display_recurrence, tuple(tag_names[activity.id]))
+                fields[activity.id] = _display_cache[keys[activity.id]] = entry
+            while len(_display_cache) > DISPLAY_CACHE_SIZE:
+                _display_cache.popitem(last=False)
+
+    return fields
+
+
+def occurrence_views(occurrences, join_status=None, today=None, distances=None):
+    """ActivityView tuples for activities.Occurrence entries, in the same order.
+
+    join_status(occurrence) gives each view's join_activity value, and
+    distances ({id: km}) their distance_km.
+    """
+    today = today or date.today()
+    fields = display_fields([occurrence.activity for occurrence in occurrences])
+
+    views = []
+    for occurrence in occurrences:
+        activity = occurrence.activity
+        display_time, display_recurrence, tag_names = fields[activity.id]
+        views.append(ActivityView(
+            id=activity.id,
+            creator_id=activity.creator_id,
+            name=activity.name,
+            description=activity.description,
+            type=activity.type,
+            energy=activity.energy,
+            format_type=activity.format_type,
+            location=activity.location,
+            date=occurrence.date,
+            time=activity.time,
+            duration_hours=activity.duration_hours,
+            duration_minutes=activity.duration_minutes,
+            participants=(activity.participants or 0) + occurrence.participants,
+            max_participants=activity.max_participants,
+            display_date=format_display_date(occurrence.date),
+            display_time=display_time,
+            tag_names=tag_names,
+            days_until=(occurrence.date - today).days if occurrence.date else None,
+            join_activity=join_status(occurrence) if join_status else None,
+            recurrence=activity.recurrence,
+            display_recurrence=display_recurrence,
+            occurrence_date=occurrence.date if activity.recurrence else None,
+            cancelled=occurrence.cancelled,
+            distance_km=distances.get(activity.id) if distances else None,
+        ))
+    return views
+
+
+def activity_views(activities, join_status=None, today=None):
+    """ActivityView tuples for Activity rows, each shown at its own (first) date."""
+    return occurrence_views([single_occurrence(activity) for activity in activities], join_status, today)
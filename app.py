@@ -1,16 +1,41 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify, abort
+from flask import (Flask, render_template, request, flash, redirect, url_for, session, jsonify, abort,
+                   Response, stream_with_context)
 from extensions import db, migrate
-from messages import Message, Contact
-from activities import Activity, ActivityParticipant
+from messages import (Message, Contact, get_inbox, get_chat_page, get_chat_window,
+                      find_search_hit, in_visible_chat, message_position, encode_cursor, decode_cursor,
+                      backfill_inbox_columns, search_messages, mark_read,
+                      validate_contact, create_message_search_index, rebuild_message_search_index)
+from activities import (Activity, ActivityParticipant, ActivityOccurrence, parse_activity_date,
+                        parse_activity_time, activity_start_order, decode_activity_cursor,
+                        explore_filters, get_explore_page, explore_facet_counts, add_participant,
+                        remove_participant, next_occurrences, single_occurrence,
+                        is_occurrence_date, set_occurrence_cancelled, add_occurrence_participant,
+                        remove_occurrence_participant, user_schedule, schedule_version,
+                        locate_activity, activities_within, get_nearby_page, decode_distance_cursor,
+                        RECURRENCES, ACTIVITY_FULL, OCCURRENCE_CANCELLED,
+                        EXPLORE_RADII_KM, DEFAULT_RADIUS_KM, MAX_RADIUS_KM)
 from users import User
 from datetime import datetime, timedelta, date
-from groups import Group, GroupMember, GroupPost, GroupComment, GroupChatMessage, BuddyQuizResponse
+from groups import (Group, GroupMember, GroupPost, GroupComment, GroupChatMessage, BuddyQuizResponse,
+                    add_group_member, remove_group_member, reconcile_group_counts,
+                    get_feed_page, latest_comments, get_comments_page, decode_feed_cursor,
+                    GroupPostLike, add_post_like, remove_post_like, liked_post_ids)
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 import os
-import pytz
 from functools import wraps
+import click
 from posts import Post
+from tags import set_activity_tags, set_group_tags
+from activity_views import activity_views, occurrence_views
+from geo import geocode, place_names
+from calendar_feed import new_feed_token, feed_etag, feed_last_modified, iter_calendar
 from reports import Report
+from realtime import init_realtime, publish, last_event_id, stream_new_rows
+from timefmt import format_sg, format_sg_many, DATETIME_FORMAT, TIME_FORMAT
+from contact_import import READ_ERRORS, read_contact_rows, import_contacts
+from delete_jobs import (DeleteJob, init_delete_worker, notify_delete_worker,
+                         enqueue_history_clear, enqueue_contact_delete)
 
 
 app = Flask(__name__)
@@ -24,9 +49,13 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 db.init_app(app)
 migrate.init_app(app, db)
+init_realtime(app)
 
 with app.app_context():
     db.create_all()
+    create_message_search_index()
+
+init_delete_worker(app)
 
 # ============================================
 # AUTHENTICATION HELPERS
@@ -295,72 +324,55 @@ def home():
 # MESSAGES ROUTES
 # ============================================
 
+def get_contact_or_404(contact_id):
+    """Like get_or_404, but contacts waiting on a delete job are already gone."""
+    return Contact.query.filter_by(id=contact_id, deleted_at=None).first_or_404()
+
 @app.template_filter("sgtime")
 def sgtime(dt):
-    if not dt:
-        return ""
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=pytz.utc)
-    sg_tz = pytz.timezone("Asia/Singapore")
-    return dt.astimezone(sg_tz).strftime("%d %b %Y, %I:%M %p")
+    return format_sg(dt, DATETIME_FORMAT)
 
 @app.template_filter("onlytime")
 def onlytime(dt):
-    if not dt:
-        return ""
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=pytz.utc)
-    sg_tz = pytz.timezone("Asia/Singapore")
-    return dt.astimezone(sg_tz).strftime("%I:%M %p")
+    return format_sg(dt, TIME_FORMAT)
+
+@app.template_filter("message_times")
+def message_times(messages):
+    """Map message id -> Singapore time for a whole page in one pass."""
+    times = format_sg_many([m.timestamp for m in messages], TIME_FORMAT)
+    return {m.id: time for m, time in zip(messages, times)}
+
+@app.template_filter("message_cursor")
+def message_cursor(message):
+    return encode_cursor(message)
 
 @app.route("/messages")
 @login_required
 def messages():
     search = request.args.get("search", "")
     status_filter = request.args.get("status")
+    page = request.args.get("page", 1, type=int)
 
-    query = Contact.query
-
-    if search:
-        query = query.filter(
-            (Contact.name.ilike(f"%{search}%")) |
-            (Contact.phone.ilike(f"%{search}%")) |
-            (Contact.short_desc.ilike(f"%{search}%")) |
-            (Contact.messages.any(Message.content.ilike(f"%{search}%")))
-        )
-
-    if status_filter:
-        query = query.filter(Contact.message_status == status_filter)
-
-    contacts = query.all()
-
-    for c in contacts:
-        last_msg = (
-            Message.query.filter_by(contact_id=c.id)
-            .order_by(Message.timestamp.desc())
-            .first()
-        )
-        c.last_chat = last_msg.timestamp if last_msg else None  # Set to None if no messages
-
-    contacts.sort(
-        key=lambda c: c.last_chat or datetime.min,
-        reverse=True
-    )
+    inbox, has_next = get_inbox(search=search, status_filter=status_filter, page=page)
 
     messages = []
     if search:
-        messages_query = Message.query.filter(Message.content.ilike(f"%{search}%"))
-        if status_filter:
-            messages_query = messages_query.filter(Message.status == status_filter)
-        messages = messages_query.order_by(Message.timestamp.desc()).all()
+        messages = search_messages(search, status=status_filter)
 
-    return render_template("messages.html", contacts=contacts, messages=messages, title="Messages")
+    return render_template(
+        "messages.html",
+        inbox=inbox,
+        messages=messages,
+        page=page,
+        has_next=has_next,
+        title="Messages"
+    )
 
 
 @app.route("/textchat/<int:contact_id>", methods=["GET", "POST"])
 @login_required
 def textchat(contact_id):
-    contact = Contact.query.get_or_404(contact_id)
+    contact = get_contact_or_404(contact_id)
     user = get_current_user()  # Ensure this returns the logged-in user
 
     if request.method == "POST":
@@ -373,44 +385,155 @@ def textchat(contact_id):
             )
             db.session.add(new_msg)
             db.session.commit()
+            publish(f"contact:{contact.id}")
         return redirect(url_for("textchat", contact_id=contact.id))
 
-    # Always load all messages for the chat
-    messages = (
-        Message.query.filter_by(contact_id=contact.id)
-        .order_by(Message.timestamp.asc())
-        .all()
-    )
-
-    # --- Handle search query ---
     search_term = request.args.get("search")
     highlight_id = None
+    previous_hit = next_hit = None
+    has_newer = False
+
+    # --- Handle search query: render only the window around the current hit ---
+    hit = None
     if search_term:
-        match = (
-            Message.query.filter(
-                Message.contact_id == contact.id,
-                Message.content.ilike(f"%{search_term}%")
-            )
-            .order_by(Message.timestamp.asc())
-            .first()
-        )
-        if match:
-            highlight_id = match.id
+        hit_id = request.args.get("hit", type=int)
+        if hit_id:
+            hit = Message.query.filter(Message.id == hit_id, in_visible_chat(contact.id)).first()
+        if hit is None:
+            hit = find_search_hit(contact.id, search_term)
+
+    if hit:
+        highlight_id = hit.id
+        messages, older_cursor, has_newer = get_chat_window(contact.id, hit)
+        position = message_position(hit)
+        previous_hit = find_search_hit(contact.id, search_term, position, direction="previous")
+        next_hit = find_search_hit(contact.id, search_term, position, direction="next")
+    else:
+        # Only the newest page is rendered; older days are lazy-loaded
+        messages, older_cursor = get_chat_page(contact.id)
 
     return render_template(
         "textchat.html",
         contact=contact,
         messages=messages,
+        older_cursor=older_cursor,
+        has_newer=has_newer,
         user=user,
-        highlight_id=highlight_id
+        highlight_id=highlight_id,
+        previous_hit=previous_hit,
+        next_hit=next_hit
     )
 
+
+@app.route("/textchat/<int:contact_id>/history")
+@login_required
+def textchat_history(contact_id):
+    contact = get_contact_or_404(contact_id)
+    user = get_current_user()
+
+    try:
+        before = decode_cursor(request.args["before"])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+    messages, older_cursor = get_chat_page(contact.id, before=before)
+
+    return jsonify({
+        'success': True,
+        'older_cursor': older_cursor,
+        'messages': [
+            {
+                'id': m.id,
+                'username': m.username,
+                'content': m.content,
+                'status': m.status,
+                'timestamp': m.timestamp.isoformat(),
+            }
+            for m in messages
+        ],
+        'html': render_template("textchat_messages.html", messages=messages, user=user),
+    })
+
+@app.route("/textchat/<int:contact_id>/stream")
+@login_required
+def textchat_stream(contact_id):
+    contact = get_contact_or_404(contact_id)
+    user = get_current_user()
+    newest_id = db.session.query(db.func.max(Message.id)).filter_by(contact_id=contact.id).scalar()
+
+    def fetch_after(last_id):
+        return (
+            Message.query.filter(in_visible_chat(contact_id), Message.id > last_id)
+            .order_by(Message.id.asc())
+            .limit(100)
+            .all()
+        )
+
+    def serialize(message):
+        return {
+            'id': message.id,
+            'username': message.username,
+            'content': message.content,
+            'html': render_template("textchat_messages.html", messages=[message], user=user),
+        }
+
+    events = stream_new_rows(f"contact:{contact_id}", last_event_id(newest_id or 0), fetch_after, serialize)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route("/textchat/<int:contact_id>/read", methods=["POST"])
+@login_required
+def mark_messages_read(contact_id):
+    contact = get_contact_or_404(contact_id)
+    data = request.get_json(silent=True) or {}
+
+    if data.get("up_to"):
+        try:
+            position = decode_cursor(data["up_to"])
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    else:
+        newest = (
+            Message.query.filter(in_visible_chat(contact.id))
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .first()
+        )
+        if not newest:
+            return jsonify({'success': True, 'updated': 0, 'unread_count': contact.unread_count})
+        position = message_position(newest)
+
+    updated = mark_read(contact, position)
+    db.session.commit()
+
+    return jsonify({'success': True, 'updated': updated, 'unread_count': contact.unread_count})
+
+
 @app.route('/send_message', methods=['POST'])
+@login_required
 def send_message():
-    # ... (existing code)
-    contact = Contact.query.get(contact_id)
-    contact.last_chat = datetime.utcnow()  # Update last_chat
-    db.session.commit()
+    data = request.get_json() if request.is_json else request.form
+    contact_id = data.get("contact_id")
+    content = (data.get("content") or "").strip()
+    user = get_current_user()
+
+    if not contact_id:
+        abort(400)
+    contact = get_contact_or_404(int(contact_id))
+
+    if content:
+        # last_chat is updated by the Message write hooks in the same transaction
+        new_msg = Message(username=user.full_name, content=content, contact_id=contact.id)
+        db.session.add(new_msg)
+        db.session.commit()
+        publish(f"contact:{contact.id}")
+
+    if request.is_json:
+        return jsonify({'success': bool(content)})
+    return redirect(url_for("textchat", contact_id=contact.id))
 
 
 @app.route('/delete_text_message/<int:message_id>', methods=['POST'])
@@ -423,21 +546,12 @@ def delete_text_message(message_id):
         if message.username != user.full_name:
             abort(403)
 
-        contact = message.contact
-        contact_id = contact.id
+        contact_id = message.contact_id
 
-        # Delete the message
+        # Delete the message (last_chat is recomputed by the write hooks)
         db.session.delete(message)
         db.session.commit()
 
-        # Update last_chat
-        newest_message = Message.query.filter_by(
-            contact_id=contact_id
-        ).order_by(Message.timestamp.desc()).first()
-        
-        contact.last_chat = newest_message.timestamp if newest_message else None
-        db.session.commit()
-
         flash('Message deleted successfully!', 'success')
         return redirect(url_for('textchat', contact_id=contact_id))
     
@@ -469,16 +583,14 @@ def update_message(message_id):
 @app.route('/delete_chat_history/<int:contact_id>', methods=['POST'])
 @login_required
 def delete_chat_history(contact_id):
-    contact = Contact.query.get_or_404(contact_id)
-    user = get_current_user()
-
-    # Delete all messages for this contact
-    Message.query.filter_by(contact_id=contact.id).delete()
-    
-    # Set last_chat to None since all messages are deleted
-    contact.last_chat = None
+    contact = get_contact_or_404(contact_id)
 
+    # Hide the messages now; a background job deletes them in chunks
+    job = enqueue_history_clear(contact)
     db.session.commit()
+    if job:
+        notify_delete_worker(app)
+
     flash('Chat history deleted successfully!', 'success')
     return redirect(url_for('messages'))
 
@@ -491,26 +603,10 @@ def create_contact():
         short_desc = request.form.get("short_desc", "").strip()
 
         # Validation errors
-        errors = {}
-
-        # Validate name
-        if not name:
-            errors["name"] = "Name is required."
-        elif len(name) > 35:
-            errors["name"] = "Name cannot exceed 35 characters."
-
-        # Validate phone
-        if not phone:
-            errors["phone"] = "Phone number is required."
-        elif len(phone) != 8 or not phone.isdigit():
-            errors["phone"] = "Phone number must be exactly 8 digits."
-        elif Contact.query.filter_by(phone=phone).first():
+        errors = validate_contact(name, phone, short_desc)
+        if "phone" not in errors and Contact.query.filter_by(phone=phone).first():
             errors["phone"] = "This phone number is already registered."
 
-        # Validate short description
-        if short_desc and len(short_desc) > 120:
-            errors["short_desc"] = "Short description cannot exceed 120 characters."
-
         # If errors exist, show them
         if errors:
             for field, message in errors.items():
@@ -546,20 +642,54 @@ def create_contact():
     return render_template("create_contact.html", title="Create Contact")
 
 
+@app.route("/contacts/import", methods=["POST"])
+@login_required
+def import_contacts_upload():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'Please upload a file.'}), 400
+
+    try:
+        rows = read_contact_rows(upload.stream, upload.filename)
+        result = import_contacts(rows)
+    except READ_ERRORS as e:
+        # Nothing was read, so nothing was committed
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'created': result.created,
+        'skipped': result.skipped,
+        'errors': result.errors,
+    })
+
+
 @app.route('/delete_contact/<int:contact_id>', methods=['POST'])
 @login_required
 def delete_contact(contact_id):
-    contact = Contact.query.get_or_404(contact_id)
-    db.session.delete(contact)
+    contact = get_contact_or_404(contact_id)
+
+    # Hide the contact now; a background job deletes its messages and the row
+    enqueue_contact_delete(contact)
     db.session.commit()
+    notify_delete_worker(app)
+
     flash("Contact deleted successfully!", "contact_deleted")
     return redirect(url_for('messages'))
 
 
+@app.route('/jobs/delete/<int:job_id>')
+@login_required
+def delete_job_status(job_id):
+    job = DeleteJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
 @app.route('/edit_contact/<int:contact_id>', methods=['GET', 'POST'])
 @login_required
 def edit_contact(contact_id):
-    contact = Contact.query.get_or_404(contact_id)
+    contact = get_contact_or_404(contact_id)
 
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -601,42 +731,63 @@ def edit_contact(contact_id):
 # ACTIVITIES ROUTES
 # ============================================
 
-# Helper to check if user joined an activity
-def user_joined_activity(user_id, activity_id):
-    return ActivityParticipant.query.filter_by(
-        participant_id=user_id, activity_id=activity_id
-    ).first() is not None
+def joined_activity_ids(user_id, activity_ids):
+    """Ids among activity_ids whose whole series the user has joined, in one query."""
+    if not activity_ids:
+        return set()
+    return {
+        activity_id for (activity_id,) in
+        db.session.query(ActivityParticipant.activity_id)
+        .filter(ActivityParticipant.participant_id == user_id,
+                ActivityParticipant.activity_id.in_(activity_ids),
+                ActivityParticipant.occurrence_id.is_(None))
+    }
 
-def parse_activity_date(date_str):
-    for fmt in ("%Y-%m-%d", "%d %b %Y", "%m/%d/%Y", "%d/%m/%Y"):
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
-            continue
-    # If none match, return None or raise an error
-    return None
+def read_recurrence(form, start_date):
+    """(recurrence, until, error) from the Repeats/Until fields of an activity form."""
+    recurrence = form.get("recurrence") or None
+    if recurrence is None:
+        return None, None, None
+    if recurrence not in RECURRENCES:
+        return None, None, "Please choose how often the activity repeats."
+
+    until = None
+    if form.get("recurrence_until"):
+        until = parse_activity_date(form["recurrence_until"])
+        if not until or until < start_date:
+            return None, None, "The repeat end date must be on or after the first date."
+    return recurrence, until, None
+
+def read_explore_origin(args):
+    """(latitude, longitude, radius_km) for explore's distance filter, or None.
+
+    The centre is the browser's position (lat/lon) or a gazetteer place
+    (near); an unknown place gives None.
+    """
+    if not (args.get("near") or args.get("lat") or args.get("lon")):
+        return None
+
+    radius = args.get("km", DEFAULT_RADIUS_KM, type=float)
+    if not 0 < radius <= MAX_RADIUS_KM:
+        abort(400)
+
+    if args.get("lat") or args.get("lon"):
+        latitude, longitude = args.get("lat", type=float), args.get("lon", type=float)
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            abort(400)
+        return latitude, longitude, radius
+
+    point = geocode(args["near"])
+    return point + (radius,) if point else None
 
 @app.route("/activities")
 @login_required
 def activities():
     user = get_current_user()
     
-    activities = Activity.query.filter_by(creator_id=user.id).order_by(Activity.date.asc()).all()
-
-    for activity in activities:
-        activity.tags = activity.tags.split(",") if activity.tags else []
-
-        parsed_date = parse_activity_date(activity.date)
-        if parsed_date:
-            activity.display_date = parsed_date.strftime("%d %b %Y")
-        else:
-            activity.display_date = activity.date  # fallback
-
-        try:
-            parsed_time = datetime.strptime(activity.time, "%H:%M")
-        except ValueError:
-            parsed_time = datetime.strptime(activity.time, "%I:%M %p")
-        activity.display_time = parsed_time.strftime("%I:%M %p").lstrip("0")
+    activities = activity_views(
+        Activity.query.filter_by(creator_id=user.id).order_by(*activity_start_order()).all()
+    )
 
     num_activities = len(activities)
 
@@ -657,8 +808,10 @@ def activity_delete(activity_id):
     if activity.creator_id != user.id:
         abort(403)
 
-    # Delete associated participant records
+    # Delete associated participant records, occurrences and tag links
     ActivityParticipant.query.filter_by(activity_id=activity.id).delete()
+    ActivityOccurrence.query.filter_by(activity_id=activity.id).delete()
+    set_activity_tags(activity, "")
     
     db.session.delete(activity)
     db.session.commit()
@@ -675,8 +828,8 @@ def activity_create():
         description = request.form.get("description")
         format_type = request.form.get("format_type")
         location = request.form.get("location")
-        date_input = request.form.get("date")
-        time_input = request.form.get("time")
+        date_input = parse_activity_date(request.form.get("date"))
+        time_input = parse_activity_time(request.form.get("time"))
         duration_hours = int(request.form.get("duration_hours", 0))
         duration_minutes = int(request.form.get("duration_minutes", 0))
         type_ = request.form.get("type") or "Other"
@@ -684,6 +837,15 @@ def activity_create():
         max_participants = int(request.form.get("max_participants", 0))
         tags = request.form.get("tags") or ""
 
+        if not date_input or not time_input:
+            flash("Please enter a valid date and time.", "error")
+            return redirect(url_for('activity_create'))
+
+        recurrence, recurrence_until, error = read_recurrence(request.form, date_input)
+        if error:
+            flash(error, "error")
+            return redirect(url_for('activity_create'))
+
         if format_type:
             format_type = format_type.title()
 
@@ -695,6 +857,8 @@ def activity_create():
             description=description,
             date=date_input,
             time=time_input,
+            recurrence=recurrence,
+            recurrence_until=recurrence_until,
             duration_hours=duration_hours,
             duration_minutes=duration_minutes,
             format_type=format_type,
@@ -703,11 +867,13 @@ def activity_create():
             energy=energy,
             max_participants=max_participants,
             participants=1,  # creator counts as participant
-            tags=tags,
             creator_id=user.id
         )
+        locate_activity(new_activity)
 
         db.session.add(new_activity)
+        db.session.flush()
+        set_activity_tags(new_activity, tags)
         db.session.commit()
 
         # Add creator as participant
@@ -737,23 +903,37 @@ def edit_activity(activity_id):
         abort(403)
 
     if request.method == 'POST':
+        activity_date = parse_activity_date(request.form['date'])
+        activity_time = parse_activity_time(request.form['time'])
+        if not activity_date or not activity_time:
+            flash("Please enter a valid date and time.", "error")
+            return redirect(url_for('edit_activity', activity_id=activity.id))
+
+        recurrence, recurrence_until, error = read_recurrence(request.form, activity_date)
+        if error:
+            flash(error, "error")
+            return redirect(url_for('edit_activity', activity_id=activity.id))
+
         activity.name = request.form['name']
         activity.description = request.form['description']
-        activity.date = request.form['date']
-        activity.time = request.form['time']
+        activity.date = activity_date
+        activity.time = activity_time
+        activity.recurrence = recurrence
+        activity.recurrence_until = recurrence_until
         activity.duration_hours = int(request.form['duration_hours'])
         activity.duration_minutes = int(request.form['duration_minutes'])
         activity.format_type = request.form['format_type']
         activity.location = request.form['location'] if activity.format_type == 'In-Person' else 'Online'
+        locate_activity(activity)
         activity.type = request.form['type']
         activity.energy = request.form['energy']
         activity.max_participants = int(request.form['max_participants'])
-        activity.tags = request.form.get('tags', '')
+        set_activity_tags(activity, request.form.get('tags', ''))
 
         db.session.commit()
         return redirect(url_for('activities'))
 
-    tags = activity.tags.split(',') if activity.tags else []
+    tags = activity.tag_names
     
     my_activities_count = Activity.query.filter_by(creator_id=user.id).count()
     return render_template(
@@ -769,62 +949,55 @@ def edit_activity(activity_id):
 @login_required
 def explore():
     user = get_current_user()
-    query = Activity.query
 
-    # --- Search filter ---
-    search = request.args.get("search")
-    if search:
-        query = query.filter(
-            (Activity.name.ilike(f"%{search}%")) |
-            (Activity.type.ilike(f"%{search}%")) |
-            (Activity.tags.ilike(f"%{search}%"))
-        )
-
-    # --- Category filter ---
-    category = request.args.get("category")
-    if category:
-        query = query.filter_by(type=category)
-
-    # --- Energy filter ---
-    energy = request.args.get("energy")
-    if energy:
-        query = query.filter_by(energy=energy)
-
-    # --- Format filter ---
-    format_type = request.args.get("format")
-    if format_type:
-        query = query.filter_by(format_type=format_type)
-
-    # --- Fetch and process activities ---
-    activities = query.order_by(Activity.date.asc()).all()
-
-    for a in activities:
-        # Split tags for display only
-        a.display_tags = a.tags.split(",") if a.tags else []
+    # Optional "within N km" filter, nearest first
+    origin = read_explore_origin(request.args)
+    distances = activities_within(*origin) if origin else None
+
+    filters = explore_filters(
+        search=request.args.get("search"),
+        tag=request.args.get("tag"),
+        near=distances,
+        category=request.args.get("category"),
+        energy=request.args.get("energy"),
+        format=request.args.get("format"),
+    )
 
-        # Parse and format date
-        parsed_date = parse_activity_date(a.date)
-        if parsed_date:
-            a.display_date = parsed_date.strftime("%d %b %Y")
-        else:
-            a.display_date = a.date  # fallback
+    after = None
+    if request.args.get("after"):
         try:
-            parsed_time = datetime.strptime(a.time, "%H:%M")
+            after = (decode_distance_cursor if origin else decode_activity_cursor)(request.args["after"])
         except ValueError:
-            parsed_time = datetime.strptime(a.time, "%I:%M %p")
-        a.display_time = parsed_time.strftime("%I:%M %p").lstrip("0")
+            abort(400)
 
-        # Determine join status for current user
+    today = date.today()
+    if origin:
+        activities, next_cursor = get_nearby_page(filters, distances, after=after)
+    else:
+        activities, next_cursor = get_explore_page(filters, after=after, today=today)
+    facets = explore_facet_counts(filters)
+    joined_ids = joined_activity_ids(user.id, [a.id for a in activities])
+
+    # Recurring activities are shown at their next date
+    upcoming = next_occurrences(activities, today)
+    occurrences = [upcoming.get(a.id) or single_occurrence(a) for a in activities]
+
+    # Determine join status for current user
+    def join_status(occurrence):
+        a = occurrence.activity
         if a.creator_id == user.id:
-            a.join_activity = "created"
+            return "created"
         elif a.participants >= a.max_participants:
-            a.join_activity = "max"
-        elif user_joined_activity(user.id, a.id):
-            a.join_activity = 'true'
-        else:
-            a.join_activity = 'false'
+            return "max"
+        elif a.id in joined_ids:
+            return 'true'
+        return 'false'
 
-    return render_template("explore.html", activities=activities)
+    activities = occurrence_views(occurrences, join_status=join_status, distances=distances)
+
+    return render_template("explore.html", activities=activities, facets=facets, next_cursor=next_cursor,
+                           place_names=place_names(), radii=EXPLORE_RADII_KM,
+                           default_radius=DEFAULT_RADIUS_KM, unknown_place=not origin and request.args.get("near"))
 
 
 @app.route('/update-join', methods=['POST'])
@@ -839,26 +1012,28 @@ def update_join():
     if not activity:
         return jsonify({'success': False, 'message': 'Activity not found'})
 
-    participant_record = ActivityParticipant.query.filter_by(
-        participant_id=user.id, activity_id=activity_id
-    ).first()
+    # Optional: join or leave one date of a recurring activity instead of the series
+    occurrence_date = None
+    if data.get('occurrence_date'):
+        if not activity.recurrence:
+            return jsonify({'success': False, 'message': 'Only recurring activities can be joined by date'}), 400
+        occurrence_date = parse_activity_date(data['occurrence_date'])
+        if not occurrence_date or not is_occurrence_date(activity, occurrence_date):
+            return jsonify({'success': False, 'message': 'The activity does not take place on that date'}), 400
 
     if join_activity:
-        if not participant_record:
-            new_participant = ActivityParticipant(
-                participant_id=user.id,
-                activity_id=activity_id,
-                creator_id=activity.creator_id
-            )
-            db.session.add(new_participant)
-            activity.participants += 1
-            db.session.commit()
+        if occurrence_date:
+            result = add_occurrence_participant(activity, occurrence_date, user.id)
+        else:
+            result = add_participant(activity, user.id)
+        if result == ACTIVITY_FULL:
+            return jsonify({'success': False, 'status': 'full', 'message': 'This activity is full.'}), 409
+        if result == OCCURRENCE_CANCELLED:
+            return jsonify({'success': False, 'status': 'cancelled', 'message': 'This date has been cancelled.'}), 409
+    elif occurrence_date:
+        remove_occurrence_participant(activity, occurrence_date, user.id)
     else:
-        if participant_record:
-            db.session.delete(participant_record)
-            if activity.participants > 0:
-                activity.participants -= 1
-            db.session.commit()
+        remove_participant(activity, user.id)
 
     return jsonify({'success': True})
 
@@ -882,72 +1057,64 @@ def leave_activity(activity_id):
     if activity.creator_id == user.id:
         return "", 403
 
-    participant_record = ActivityParticipant.query.filter_by(
-        participant_id=user.id, activity_id=activity_id
-    ).first()
+    # ?date= leaves one date that was joined on its own
+    if request.args.get("date"):
+        occurrence_date = parse_activity_date(request.args["date"])
+        if not occurrence_date:
+            return "", 400
+        remove_occurrence_participant(activity, occurrence_date, user.id)
+    else:
+        remove_participant(activity, user.id)
+    return "", 204
 
-    if participant_record:
-        db.session.delete(participant_record)
-        if activity.participants > 0:
-            activity.participants -= 1
-        db.session.commit()
 
-    return "", 204
+@app.route("/activities/<int:activity_id>/occurrences/<occurrence_date>/cancel", methods=["POST"])
+@login_required
+def cancel_occurrence(activity_id, occurrence_date):
+    return update_occurrence_cancelled(activity_id, occurrence_date, True)
 
 
-@app.route("/schedule")
+@app.route("/activities/<int:activity_id>/occurrences/<occurrence_date>/restore", methods=["POST"])
 @login_required
-def schedule():
-    user = get_current_user()
-    activities = Activity.query.order_by(Activity.date.asc()).all()
-    today = date.today()
+def restore_occurrence(activity_id, occurrence_date):
+    return update_occurrence_cancelled(activity_id, occurrence_date, False)
 
-    upcoming_week_activities = []
-    other_activities = []
-    filtered_activities = []
 
-    for activity in activities:
-        is_creator = activity.creator_id == user.id
-        is_joined = user_joined_activity(user.id, activity.id)
+def update_occurrence_cancelled(activity_id, occurrence_date, cancelled):
+    activity = Activity.query.get_or_404(activity_id)
+    user = get_current_user()
 
-        if not (is_creator or is_joined):
-            continue
+    if activity.creator_id != user.id:
+        abort(403)
 
-        activity.display_tags = activity.tags.split(",") if activity.tags else []
-        parsed_date = parse_activity_date(activity.date)
-        if parsed_date:
-            activity.display_date = parsed_date.strftime("%d %b %Y")
-            activity.display_date_obj = parsed_date.date()
-            activity.days_until = (activity.display_date_obj - today).days
-        else:
-            activity.display_date = activity.date  # fallback
-            activity.display_date_obj = today
-            activity.days_until = 0
+    day = parse_activity_date(occurrence_date)
+    if not day or not activity.recurrence or not is_occurrence_date(activity, day):
+        abort(404)
+
+    set_occurrence_cancelled(activity, day, cancelled)
+    return redirect(url_for("schedule"))
 
-        try:
-            parsed_time = datetime.strptime(activity.time, "%H:%M")
-        except ValueError:
-            parsed_time = datetime.strptime(activity.time, "%I:%M %p")
-        activity.display_time = parsed_time.strftime("%I:%M %p").lstrip("0")
 
-        if is_creator:
-            activity.join_activity = "created"
-        elif is_joined:
-            activity.join_activity = "true"
+@app.route("/schedule")
+@login_required
+def schedule():
+    user = get_current_user()
+    today = date.today()
+    week_end = today + timedelta(days=7)
 
-        if activity.days_until >= 0:
-            filtered_activities.append(activity)
+    occurrences, join_status = user_schedule(user.id, today)
+    views = occurrence_views(occurrences, join_status=join_status, today=today)
+    upcoming_week_activities = [view for view in views if view.date <= week_end]
+    other_activities = [view for view in views if view.date > week_end]
 
-            if activity.days_until <= 7:
-                upcoming_week_activities.append(activity)
-            else:
-                other_activities.append(activity)
+    scheduled = [view for view in views if not view.cancelled]
+    total_activities = len(scheduled)
+    this_week_activities = sum(1 for view in scheduled if view.date <= week_end)
+    organizing_activities = sum(1 for view in scheduled if view.creator_id == user.id)
 
-    total_activities = len(filtered_activities)
-    this_week_activities = len(upcoming_week_activities)
-    organizing_activities = len(
-        [a for a in filtered_activities if a.creator_id == user.id]
-    )
+    calendar_feed_url = None
+    if user.calendar_token:
+        calendar_feed_url = url_for('calendar_feed', token=user.calendar_token, _external=True)
 
     return render_template(
         "schedule.html",
@@ -956,10 +1123,58 @@ def schedule():
         this_week_activities=this_week_activities,
         organizing_activities=organizing_activities,
         upcoming_week_activities=upcoming_week_activities,
-        other_activities=other_activities
+        other_activities=other_activities,
+        calendar_feed_url=calendar_feed_url
     )
 
 
+@app.route("/schedule/calendar-feed", methods=["POST"])
+@login_required
+def reset_calendar_feed():
+    """Turn on the calendar feed, or replace its URL; any old URL stops working."""
+    user = get_current_user()
+    user.calendar_token = new_feed_token()
+    db.session.commit()
+    flash('Your calendar feed link is ready.', 'success')
+    return redirect(url_for('schedule'))
+
+
+@app.route("/schedule/calendar-feed/revoke", methods=["POST"])
+@login_required
+def revoke_calendar_feed():
+    user = get_current_user()
+    user.calendar_token = None
+    db.session.commit()
+    flash('Your calendar feed link has been turned off.', 'success')
+    return redirect(url_for('schedule'))
+
+
+@app.route("/calendar/<token>.ics")
+def calendar_feed(token):
+    # No login: calendar apps fetch the feed with the secret token alone
+    user = User.query.filter_by(calendar_token=token).first_or_404()
+    today = date.today()
+
+    # Polls with nothing new get a 304 without building any events
+    version = schedule_version(user.id)
+    etag = feed_etag(today, version)
+    last_modified = feed_last_modified(today, version)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        occurrences, _ = user_schedule(user.id, today)
+        response = Response(
+            stream_with_context(iter_calendar(occurrences, f"{user.full_name} - ShareJoy")),
+            mimetype="text/calendar",
+        )
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 # ==========================================
 #  GROUPS ROUTES
 # ==========================================
@@ -971,16 +1186,19 @@ def groups():
     from seed_demo_data import check_and_seed_demo_groups
     check_and_seed_demo_groups()
 
-    current_user = session.get('user_name', 'User')
-    current_user_obj = User.query.filter_by(full_name=current_user).first()
+    current_user_obj = get_current_user()
     current_user_age_category = current_user_obj.age_category if current_user_obj else ""
     all_groups = Group.query.order_by(Group.created_at.asc()).all()
+    my_group_ids = [m.group_id for m in GroupMember.query.filter_by(user_id=session['user_id']).all()]
 
-    # Calculate and update youth percentage for each group based on actual members
-    for group in all_groups:
-        group.youth_percentage = group.calculate_youth_percentage()
+    # Youth percentage for each group from its member counters, as seen by this viewer
+    youth_percentages = {
+        group.id: group.calculate_youth_percentage(
+            current_user_age_category if group.id in my_group_ids else None
+        )
+        for group in all_groups
+    }
 
-    my_group_ids = [m.group_id for m in GroupMember.query.filter_by(user_name=current_user).all()]
     available_groups = [g for g in all_groups if g.id not in my_group_ids]
     my_groups = [g for g in all_groups if g.id in my_group_ids]
 
@@ -1002,7 +1220,8 @@ def groups():
         title="Community Groups",
         available_groups=available_groups,
         my_groups=my_groups,
-        recommended_group_id=recommended_group_id
+        recommended_group_id=recommended_group_id,
+        youth_percentages=youth_percentages
     )
 
 
@@ -1078,7 +1297,6 @@ def create_group():
             description=description,
             category=category,
             youth_percentage=50,
-            tags=tags if tags else "Community,New",
             current_participants=1,
             max_participants=max_participants,
             privacy=privacy,
@@ -1086,14 +1304,9 @@ def create_group():
             image_url=image_filename
         )
         db.session.add(new_group)
-        db.session.commit()
-
-        creator_member = GroupMember(
-            group_id=new_group.id,
-            user_name=current_user,
-            mood_status="😊"
-        )
-        db.session.add(creator_member)
+        db.session.flush()
+        set_group_tags(new_group, tags or "Community,New")
+        add_group_member(new_group, get_current_user(), mood_status="😊")
         db.session.commit()
 
         flash(f'Group "{name}" has been created!', "success")
@@ -1106,12 +1319,19 @@ def create_group():
 @login_required
 def group_about(group_id):
     group = Group.query.get_or_404(group_id)
-    # Calculate actual youth percentage based on members
-    group.youth_percentage = group.calculate_youth_percentage()
-    return render_template("group_about.html", group=group, title=group.name)
 
+    # Youth percentage from the group's member counters
+    viewer_age_category = None
+    if group.is_demo:
+        current_user = get_current_user()
+        member = GroupMember.query.filter_by(group_id=group.id, user_id=session['user_id']).first()
+        if member and current_user:
+            viewer_age_category = current_user.age_category
+    youth_percentage = group.calculate_youth_percentage(viewer_age_category)
+    return render_template("group_about.html", group=group, youth_percentage=youth_percentage, title=group.name)
 
-def find_buddy_match(group_id, user_name, user_answer):
+
+def find_buddy_match(group_id, user_id, user_answer):
     """
     Find a compatible buddy based on quiz answers.
     Matching logic:
@@ -1120,14 +1340,8 @@ def find_buddy_match(group_id, user_name, user_answer):
     - "conversations" matches with "conversations" (social matches with social)
     - "explore" matches with anyone available
 
-    For demo groups (Board games afternoon & Walk and talk nature club), always return "Jacob V"
+    Returns the matched BuddyQuizResponse, or None. Demo groups are handled by buddy_found.
     """
-    group = Group.query.get(group_id)
-
-    # For the 2 demo groups, always return Jacob V (case-insensitive check)
-    if group and group.is_demo:
-        return "Jacob V"
-
     # Define complementary answer pairs
     complementary_matches = {
         "new_skills": "sharing",
@@ -1136,11 +1350,11 @@ def find_buddy_match(group_id, user_name, user_answer):
         "explore": None  # Can match with anyone
     }
 
-    # Get all members who have taken the quiz in this group
-    existing_responses = BuddyQuizResponse.query.filter_by(group_id=group_id).all()
-
-    # Filter out current user's previous responses
-    potential_matches = [r for r in existing_responses if r.user_name != user_name]
+    # Get all other members who have taken the quiz in this group
+    potential_matches = BuddyQuizResponse.query.filter(
+        BuddyQuizResponse.group_id == group_id,
+        BuddyQuizResponse.user_id != user_id
+    ).all()
 
     if not potential_matches:
         return None  # No one to match with yet
@@ -1151,16 +1365,16 @@ def find_buddy_match(group_id, user_name, user_answer):
         for response in potential_matches:
             # Check if they haven't been matched yet or their buddy is no longer in the group
             if response.answer == preferred_answer and not response.matched_buddy_name:
-                return response.user_name
+                return response
 
     # If explore or no complementary match found, match with anyone who hasn't been matched
     for response in potential_matches:
         if not response.matched_buddy_name:
-            return response.user_name
+            return response
 
     # If everyone is matched, match with the most recent unmatched or return first available
     if potential_matches:
-        return potential_matches[0].user_name
+        return potential_matches[0]
 
     return None
 
@@ -1182,6 +1396,7 @@ def buddy_quiz(group_id):
         # Store the quiz response
         quiz_response = BuddyQuizResponse(
             group_id=group_id,
+            user_id=session['user_id'],
             user_name=current_user,
             answer=answer
         )
@@ -1198,50 +1413,52 @@ def buddy_quiz(group_id):
 @login_required
 def buddy_found(group_id):
     group = Group.query.get_or_404(group_id)
-    # Get current logged-in user's name
-    current_user = session.get('user_name', 'User')
+    current_user = get_current_user()
 
     # Get user's quiz answer from session
     user_answer = session.get('buddy_answer', 'explore')
 
-    # Find a buddy match
-    matched_buddy = find_buddy_match(group_id, current_user, user_answer)
+    # Find a buddy match; the 2 demo groups always match with Jacob V
+    if group.is_demo:
+        match = None
+        matched_buddy = "Jacob V"
+    else:
+        match = find_buddy_match(group_id, current_user.id, user_answer)
+        matched_buddy = match.user_name if match else None
 
     # Update the quiz response with the matched buddy
     quiz_response = BuddyQuizResponse.query.filter_by(
         group_id=group_id,
-        user_name=current_user
+        user_id=current_user.id
     ).order_by(BuddyQuizResponse.created_at.desc()).first()
 
     if quiz_response and matched_buddy:
         quiz_response.matched_buddy_name = matched_buddy
 
         # Also update the matched user's response to create a two-way match
-        matched_response = BuddyQuizResponse.query.filter_by(
-            group_id=group_id,
-            user_name=matched_buddy
-        ).order_by(BuddyQuizResponse.created_at.desc()).first()
+        matched_response = None
+        if match:
+            matched_response = BuddyQuizResponse.query.filter_by(
+                group_id=group_id,
+                user_id=match.user_id
+            ).order_by(BuddyQuizResponse.created_at.desc()).first()
 
         if matched_response and not matched_response.matched_buddy_name:
-            matched_response.matched_buddy_name = current_user
+            matched_response.matched_buddy_name = current_user.full_name
 
         db.session.commit()
 
     # Add user to group if not already a member
-    existing_member = GroupMember.query.filter_by(group_id=group_id, user_name=current_user).first()
+    existing_member = GroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first()
 
-    if not existing_member:
-        new_member = GroupMember(
-            group_id=group_id,
-            user_name=current_user,
-            mood_status="😊"
-        )
-        db.session.add(new_member)
+    # None when a concurrent request joined first
+    new_member = None if existing_member else add_group_member(group, current_user, mood_status="😊")
+    if new_member:
         group.current_participants += 1
 
         # If a buddy was matched, link them
-        if matched_buddy:
-            buddy_member = GroupMember.query.filter_by(group_id=group_id, user_name=matched_buddy).first()
+        if match:
+            buddy_member = GroupMember.query.filter_by(group_id=group_id, user_id=match.user_id).first()
             if buddy_member:
                 new_member.buddy_id = buddy_member.id
 
@@ -1263,20 +1480,23 @@ def group_chat(group_id):
         if content:
             new_message = GroupChatMessage(
                 group_id=group.id,
+                user_id=session['user_id'],
                 username=username,
                 content=content
             )
             db.session.add(new_message)
             db.session.commit()
+            publish(f"group:{group.id}")
 
         return redirect(url_for("group_chat", group_id=group_id))
 
     messages = GroupChatMessage.query.filter_by(group_id=group_id).order_by(GroupChatMessage.timestamp.asc()).all()
-    current_user_name = session.get('user_name', 'User')
-    member = GroupMember.query.filter_by(group_id=group_id, user_name=current_user_name).first()
+    current_user_id = session['user_id']
+    member = GroupMember.query.filter_by(group_id=group_id, user_id=current_user_id).first()
     if not member:
-        member = GroupMember(group_id=group_id, user_name=current_user_name, mood_status="😊")
-        db.session.add(member)
+        # None when a concurrent request joined first
+        member = (add_group_member(group, get_current_user(), mood_status="😊")
+                  or GroupMember.query.filter_by(group_id=group_id, user_id=current_user_id).one())
         db.session.commit()
 
     # Get buddy information if exists
@@ -1308,11 +1528,45 @@ def group_chat(group_id):
         buddy=buddy,
         buddy_feeling_down=buddy_feeling_down,
         active_members_count=active_members_count,
-        current_user=current_user_name,
+        current_user_id=current_user_id,
         title=f"{group.name} - Chat"
     )
 
 
+@app.route("/group/<int:group_id>/chat/stream")
+@login_required
+def group_chat_stream(group_id):
+    group = Group.query.get_or_404(group_id)
+    current_user_id = session['user_id']
+    newest_id = db.session.query(db.func.max(GroupChatMessage.id)).filter_by(group_id=group.id).scalar()
+
+    def fetch_after(last_id):
+        return (
+            GroupChatMessage.query.filter(
+                GroupChatMessage.group_id == group_id,
+                GroupChatMessage.id > last_id
+            )
+            .order_by(GroupChatMessage.id.asc())
+            .limit(100)
+            .all()
+        )
+
+    def serialize(message):
+        return {
+            'id': message.id,
+            'username': message.username,
+            'content': message.content,
+            'html': render_template("group_chat_message.html", message=message, current_user_id=current_user_id),
+        }
+
+    events = stream_new_rows(f"group:{group_id}", last_event_id(newest_id or 0), fetch_after, serialize)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route("/group/<int:group_id>/feed", methods=["GET", "POST"])
 @login_required
 def group_feed(group_id):
@@ -1339,6 +1593,7 @@ def group_feed(group_id):
         if content:
             new_post = GroupPost(
                 group_id=group.id,
+                user_id=session['user_id'],
                 author=author,
                 content=content,
                 image_url=image_filename
@@ -1348,23 +1603,30 @@ def group_feed(group_id):
 
         return redirect(url_for("group_feed", group_id=group_id))
 
-    posts = GroupPost.query.filter_by(group_id=group_id).order_by(GroupPost.created_at.desc()).all()
-
-    for post in posts:
-        post.comments = GroupComment.query.filter_by(post_id=post.id).order_by(GroupComment.created_at).all()
+    before = None
+    if request.args.get("before"):
+        try:
+            before = decode_feed_cursor(request.args["before"])
+        except ValueError:
+            abort(400)
 
-    # Get current logged-in user's name
-    current_user_name = session.get('user_name', 'User')
-    member = GroupMember.query.filter_by(group_id=group_id, user_name=current_user_name).first()
+    current_user_id = session['user_id']
+    member = GroupMember.query.filter_by(group_id=group_id, user_id=current_user_id).first()
     if not member:
-        member = GroupMember(group_id=group_id, user_name=current_user_name)
-        db.session.add(member)
+        # None when a concurrent request joined first
+        member = (add_group_member(group, get_current_user())
+                  or GroupMember.query.filter_by(group_id=group_id, user_id=current_user_id).one())
         db.session.commit()
 
+    # One page of posts, then the newest few comments of each in one more query
+    posts, older_cursor = get_feed_page(group.id, before=before)
+    comments = latest_comments([post.id for post in posts])
+    liked = liked_post_ids(current_user_id, [post.id for post in posts])
+
     # Get total active members count
-    active_members_count = GroupMember.query.filter_by(group_id=group_id).count()
+    active_members_count = group.member_count
 
-    return render_template("group_feed.html", group=group, posts=posts, member=member, active_members_count=active_members_count, current_user=current_user_name, title=f"{group.name} - Feed")
+    return render_template("group_feed.html", group=group, posts=posts, comments=comments, liked=liked, older_cursor=older_cursor, member=member, active_members_count=active_members_count, current_user_id=current_user_id, title=f"{group.name} - Feed")
 
 
 @app.route("/group/<int:group_id>/settings")
@@ -1545,11 +1807,9 @@ def leave_group_confirm(group_id):
 @login_required
 def leave_group(group_id):
     group = Group.query.get_or_404(group_id)
-    current_user = session.get('user_name', 'User')
-
-    member = GroupMember.query.filter_by(group_id=group_id, user_name=current_user).first()
+    member = GroupMember.query.filter_by(group_id=group_id, user_id=session['user_id']).first()
     if member:
-        db.session.delete(member)
+        remove_group_member(group, member)
         group.current_participants = max(0, group.current_participants - 1)
         db.session.commit()
         flash(f'You have left "{group.name}".', "success")
@@ -1561,8 +1821,7 @@ def leave_group(group_id):
 @login_required
 def update_mood(group_id):
     mood = request.form.get("mood", "😊")
-    current_user_name = session.get('user_name', 'User')
-    member = GroupMember.query.filter_by(group_id=group_id, user_name=current_user_name).first()
+    member = GroupMember.query.filter_by(group_id=group_id, user_id=session['user_id']).first()
     if member:
         member.mood_status = mood
         db.session.commit()
@@ -1574,22 +1833,22 @@ def update_mood(group_id):
 @login_required
 def like_post(post_id):
     post = GroupPost.query.get_or_404(post_id)
+    group_id = post.group_id
 
+    # Liking twice or unliking a post that is not liked changes nothing
     if request.is_json:
         data = request.get_json()
         liked = data.get('liked', True)
 
         if liked:
-            post.likes += 1
+            add_post_like(post, session['user_id'])
         else:
-            post.likes = max(0, post.likes - 1)
+            remove_post_like(post, session['user_id'])
 
-        db.session.commit()
-        return jsonify({'success': True, 'likes': post.likes})
+        return jsonify({'success': True, 'liked': bool(liked), 'likes': post.likes})
 
-    post.likes += 1
-    db.session.commit()
-    return redirect(url_for("group_feed", group_id=post.group_id))
+    add_post_like(post, session['user_id'])
+    return redirect(url_for("group_feed", group_id=group_id))
 
 
 @app.route("/group/post/<int:post_id>/comment", methods=["POST"])
@@ -1599,13 +1858,13 @@ def comment_post(post_id):
 
     if request.is_json:
         data = request.get_json()
-        author = data.get("author", "User")
         content = data.get("content")
 
         if content:
             new_comment = GroupComment(
                 post_id=post.id,
-                author=author,
+                user_id=session['user_id'],
+                author=session.get('user_name', 'User'),
                 content=content
             )
             db.session.add(new_comment)
@@ -1614,13 +1873,13 @@ def comment_post(post_id):
 
         return jsonify({'success': False, 'error': 'No content provided'})
 
-    author = request.form.get("author", "User")
     content = request.form.get("content")
 
     if content:
         new_comment = GroupComment(
             post_id=post.id,
-            author=author,
+            user_id=session['user_id'],
+            author=session.get('user_name', 'User'),
             content=content
         )
         db.session.add(new_comment)
@@ -1629,12 +1888,39 @@ def comment_post(post_id):
     return redirect(url_for("group_feed", group_id=post.group_id))
 
 
+@app.route("/group/post/<int:post_id>/comments")
+@login_required
+def post_comments(post_id):
+    post = GroupPost.query.get_or_404(post_id)
+
+    try:
+        before = decode_feed_cursor(request.args["before"])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+    comments, older_cursor = get_comments_page(post.id, before)
+
+    return jsonify({
+        'success': True,
+        'older_cursor': older_cursor,
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author,
+                'content': comment.content,
+                'created_at': comment.created_at.isoformat(),
+            }
+            for comment in comments
+        ],
+        'html': render_template("group_comments.html", comments=comments, current_user_id=session['user_id']),
+    })
+
+
 @app.route("/group/message/<int:message_id>/delete", methods=["POST"])
 @login_required
 def delete_message(message_id):
     message = GroupChatMessage.query.get_or_404(message_id)
-    current_user = session.get('user_name', 'User')
-    if message.username == current_user:
+    if message.user_id == session['user_id']:
         db.session.delete(message)
         db.session.commit()
         return jsonify({'success': True})
@@ -1646,9 +1932,9 @@ def delete_message(message_id):
 @login_required
 def delete_post(post_id):
     post = GroupPost.query.get_or_404(post_id)
-    current_user = session.get('user_name', 'User')
-    if post.author == current_user:
+    if post.user_id == session['user_id']:
         GroupComment.query.filter_by(post_id=post.id).delete()
+        GroupPostLike.query.filter_by(post_id=post.id).delete()
         db.session.delete(post)
         db.session.commit()
         return jsonify({'success': True})
@@ -1660,8 +1946,7 @@ def delete_post(post_id):
 @login_required
 def delete_comment(comment_id):
     comment = GroupComment.query.get_or_404(comment_id)
-    current_user = session.get('user_name', 'User')
-    if comment.author == current_user:
+    if comment.user_id == session['user_id']:
         db.session.delete(comment)
         db.session.commit()
         return jsonify({'success': True})
@@ -1702,13 +1987,16 @@ def delete_group(group_id):
         flash(f'Cannot delete "{group.name}" - this is a protected demo group.', "error")
         return redirect(url_for("group_settings", group_id=group_id))
 
+    # The group's counters go with it
     GroupMember.query.filter_by(group_id=group_id).delete()
     GroupChatMessage.query.filter_by(group_id=group_id).delete()
     BuddyQuizResponse.query.filter_by(group_id=group_id).delete()
+    set_group_tags(group, "")
 
     posts = GroupPost.query.filter_by(group_id=group_id).all()
     for post in posts:
         GroupComment.query.filter_by(post_id=post.id).delete()
+        GroupPostLike.query.filter_by(post_id=post.id).delete()
     GroupPost.query.filter_by(group_id=group_id).delete()
 
     db.session.delete(group)
@@ -1846,5 +2134,60 @@ def submit_report():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# ============================================
+# CLI COMMANDS
+# ============================================
+
+@app.cli.command("backfill-inbox")
+def backfill_inbox_command():
+    """Recompute the stored inbox columns on contact from existing messages."""
+    updated = backfill_inbox_columns()
+    print(f"Backfilled last_chat and unread counts for {updated} contacts.")
+
+
+@app.cli.command("import-contacts")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_contacts_command(path):
+    """Bulk-import contacts from a .csv, .json or .jsonl file."""
+    try:
+        with open(path, "rb") as stream:
+            result = import_contacts(read_contact_rows(stream, path))
+    except READ_ERRORS as e:
+        # Nothing was read, so nothing was committed
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+    for error in result.errors:
+        details = "; ".join(error["errors"].values())
+        print(f"Row {error['row']}: {details}")
+    print(f"Imported {result.created} contacts, {result.skipped} rows skipped.")
+
+
+@app.cli.command("geocode-activities")
+def geocode_activities_command():
+    """Set coordinates for activities from their locations, using the gazetteer."""
+    located = 0
+    for activity in Activity.query.yield_per(500):
+        located += locate_activity(activity)
+    db.session.commit()
+    print(f"Located {located} activities.")
+
+
+@app.cli.command("reconcile-group-counts")
+def reconcile_group_counts_command():
+    """Rebuild each group's member, youth and senior counters from its members."""
+    corrected = reconcile_group_counts()
+    db.session.commit()
+    print(f"Corrected the counters of {corrected} groups.")
+
+
+@app.cli.command("rebuild-message-search")
+def rebuild_message_search_command():
+    """Rebuild the full-text index over direct messages."""
+    create_message_search_index()
+    rebuild_message_search_index()
+    print("Message search index rebuilt.")
+
+
 if __name__ == '__main__':
     app.run(debug=True)
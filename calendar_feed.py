@@ -0,0 +1,124 @@
+"""
+iCalendar (.ics) export of a user's schedule.
+
+Calendar apps poll the feed URL, so each response carries an ETag and
+Last-Modified taken from activities.schedule_version(); a poll with
+nothing new is answered with 304 before any event is built. Events are
+written one at a time as the response streams.
+"""
+
+import hashlib
+import secrets
+from datetime import datetime, time
+
+import pytz
+
+from timefmt import SG_TZ
+
+PRODID = "-//ShareJoy//Schedule//EN"
+FEED_TOKEN_BYTES = 32
+MAX_LINE_OCTETS = 75  # RFC 5545 line length, before folding
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(FEED_TOKEN_BYTES)
+
+
+def feed_last_modified(today, version):
+    """Last-Modified for the feed: the newest change, or today's start if later.
+
+    Past dates drop out of the feed each day, so it changes at midnight too.
+    """
+    last_modified, _ = version
+    start_of_day = datetime.combine(today, time.min)
+    return max(last_modified, start_of_day) if last_modified else start_of_day
+
+
+def feed_etag(today, version):
+    last_modified, counts = version
+    raw = f"{today.isoformat()}|{last_modified.isoformat() if last_modified else ''}|{counts}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def ics_text(value):
+    """Escape a TEXT property value."""
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Fold a content line at 75 octets and terminate it with CRLF."""
+    if len(line.encode("utf-8")) <= MAX_LINE_OCTETS:
+        return line + "\r\n"
+
+    parts = []
+    chunk, size, limit = "", 0, MAX_LINE_OCTETS
+    for char in line:
+        octets = len(char.encode("utf-8"))
+        if size + octets > limit:
+            parts.append(chunk)
+            # Continuation lines start with a space, which counts towards the limit
+            chunk, size, limit = "", 0, MAX_LINE_OCTETS - 1
+        chunk += char
+        size += octets
+    parts.append(chunk)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc_stamp(dt):
+    return dt.strftime("%Y%m%dT%H%M%SZ")
+
+
+def event_lines(occurrence):
+    """VEVENT lines for one activities.Occurrence.
+
+    Activity dates and times are Singapore local time; timed events are
+    written in UTC so no VTIMEZONE block is needed.
+    """
+    activity = occurrence.activity
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:activity-{activity.id}-{occurrence.date:%Y%m%d}@sharejoy",
+        f"DTSTAMP:{_utc_stamp(activity.updated_at)}",
+    ]
+
+    if activity.time:
+        start = SG_TZ.localize(datetime.combine(occurrence.date, activity.time))
+        lines.append(f"DTSTART:{_utc_stamp(start.astimezone(pytz.utc))}")
+        minutes = (activity.duration_hours or 0) * 60 + (activity.duration_minutes or 0)
+        if minutes:
+            lines.append(f"DURATION:PT{minutes // 60}H{minutes % 60}M")
+    else:
+        lines.append(f"DTSTART;VALUE=DATE:{occurrence.date:%Y%m%d}")
+
+    lines.append(f"SUMMARY:{ics_text(activity.name)}")
+    if activity.description:
+        lines.append(f"DESCRIPTION:{ics_text(activity.description)}")
+    if (activity.format_type or "").lower() == "online":
+        lines.append("LOCATION:Online")
+    elif activity.location:
+        lines.append(f"LOCATION:{ics_text(activity.location)}")
+    lines.append("STATUS:CANCELLED" if occurrence.cancelled else "STATUS:CONFIRMED")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def iter_calendar(occurrences, name):
+    """Yield the feed for a list of occurrences, one event per chunk."""
+    yield "".join(fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{ics_text(name)}",
+    ])
+    for occurrence in occurrences:
+        yield "".join(fold(line) for line in event_lines(occurrence))
+    yield fold("END:VCALENDAR")
@@ -0,0 +1,153 @@
+"""
+Bulk import of contacts from CSV or JSON files.
+
+Rows are read as a stream and validated with the same rules as the
+create-contact form. Each batch checks phone uniqueness with one IN query
+and is inserted in its own transaction, so a bad row only fails itself.
+If the file stops parsing partway through, the rows read so far are kept
+and the failure is reported against the row where reading stopped.
+"""
+
+import csv
+import io
+import json
+from collections import namedtuple
+from itertools import islice
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from messages import Contact, validate_contact
+
+IMPORT_BATCH_SIZE = 500
+
+# Raised while reading a malformed or mis-encoded file
+READ_ERRORS = (ValueError, UnicodeDecodeError, csv.Error)
+
+ImportResult = namedtuple("ImportResult", ["created", "skipped", "errors"])
+
+
+def read_contact_rows(stream, filename):
+    """Return an iterator of one dict per contact from a binary file stream.
+
+    .csv files need name, phone and short_desc columns. .jsonl files hold one
+    JSON object per line; .json files hold an array of objects. An unsupported
+    extension raises ValueError here, before anything is read.
+    """
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in ("csv", "jsonl", "json"):
+        raise ValueError("Unsupported file type. Please upload a .csv, .json or .jsonl file.")
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if extension == "csv":
+        return csv.DictReader(text)
+    if extension == "jsonl":
+        return (json.loads(line) for line in text if line.strip())
+    return iter(json.load(text))
+
+
+def _clean(row):
+    if not isinstance(row, dict):
+        return "", "", ""
+    return tuple(str(row.get(field) or "").strip() for field in ("name", "phone", "short_desc"))
+
+
+def _insert_batch(contacts):
+    """Insert validated rows; returns {row_number: errors} for rows that failed."""
+    try:
+        db.session.execute(db.insert(Contact), [fields for _, fields in contacts])
+        db.session.commit()
+        return {}
+    except IntegrityError:
+        # A phone was registered after our check: fall back to row-by-row savepoints
+        db.session.rollback()
+
+    failed = {}
+    for row_number, fields in contacts:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Contact), [fields])
+        except IntegrityError:
+            failed[row_number] = {"phone": "This phone number is already registered."}
+    db.session.commit()
+    return failed
+
+
+def _read_batch(numbered, batch_size):
+    """Read up to batch_size rows; returns (batch, read_error)."""
+    batch = []
+    try:
+        for item in islice(numbered, batch_size):
+            batch.append(item)
+    except READ_ERRORS as e:
+        return batch, e
+    return batch, None
+
+
+def import_contacts(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert contacts in batches.
+
+    Returns an ImportResult of (created, skipped, errors) where errors is a
+    list of {"row": n, "errors": {field: message}} with 1-based data row
+    numbers. A file that cannot be read at all raises one of READ_ERRORS
+    before anything is committed; one that breaks later stops there and
+    reports the break as a "file" error on the row it could not read.
+    """
+    created = 0
+    skipped = 0
+    errors = []
+    seen_phones = set()
+    rows_read = 0
+    numbered = enumerate(rows, start=1)
+
+    while True:
+        batch, read_error = _read_batch(numbered, batch_size)
+        if read_error is not None and rows_read == 0 and not batch:
+            raise read_error
+        rows_read += len(batch)
+        if not batch and read_error is None:
+            break
+
+        candidates = []
+        for row_number, row in batch:
+            name, phone, short_desc = _clean(row)
+            row_errors = validate_contact(name, phone, short_desc)
+            if "phone" not in row_errors and phone in seen_phones:
+                row_errors["phone"] = "This phone number appears more than once in the file."
+
+            if row_errors:
+                errors.append({"row": row_number, "errors": row_errors})
+                continue
+
+            seen_phones.add(phone)
+            candidates.append((row_number, {"name": name, "phone": phone, "short_desc": short_desc}))
+
+        # One set-based uniqueness check against uq_contact_phone for the whole batch
+        phones = [fields["phone"] for _, fields in candidates]
+        existing = {
+            phone for (phone,) in
+            db.session.query(Contact.phone).filter(Contact.phone.in_(phones))
+        } if phones else set()
+
+        to_insert = []
+        for row_number, fields in candidates:
+            if fields["phone"] in existing:
+                errors.append({"row": row_number, "errors": {"phone": "This phone number is already registered."}})
+            else:
+                to_insert.append((row_number, fields))
+
+        if to_insert:
+            failed = _insert_batch(to_insert)
+            created += len(to_insert) - len(failed)
+            errors.extend({"row": n, "errors": e} for n, e in failed.items())
+        skipped = rows_read - created
+
+        if read_error is not None:
+            errors.append({
+                "row": rows_read + 1,
+                "errors": {"file": f"The rest of the file could not be read: {read_error}"},
+            })
+            break
+
+    errors.sort(key=lambda error: error["row"])
+    return ImportResult(created, skipped, errors)
@@ -0,0 +1,225 @@
+"""
+Background deletion of chat history and contacts.
+
+Deleting a big conversation in the request would hold the SQLite write lock
+for seconds, so the request only hides the data and records a DeleteJob.
+A worker thread in each process claims pending jobs and deletes messages
+in chunks of DELETE_CHUNK_SIZE, committing after each chunk so other
+writers get the lock in between. Progress is stored on the job row, so any
+worker process can report it.
+
+The worker starts with the app, so jobs queued before a restart are picked
+up straight away. A running job records a heartbeat after every chunk; one
+whose heartbeat is older than STALE_JOB_AGE was left behind by a worker
+that died, and is put back to pending for any worker to finish.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from extensions import db
+from messages import Contact, Message
+
+DELETE_CHUNK_SIZE = 500
+DELETE_CHUNK_PAUSE = 0.05  # seconds between chunks
+WORKER_IDLE_POLL = 30      # seconds between checks for jobs queued by other processes
+STALE_JOB_AGE = timedelta(minutes=5)  # running job without a heartbeat for this long is reclaimed
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteJob(db.Model):
+    __tablename__ = 'delete_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # chat_history or contact
+    contact_id = db.Column(db.Integer, nullable=False, index=True)  # no FK: the contact may be deleted
+    through_message_id = db.Column(db.Integer)  # chat_history: delete messages up to this id
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/running/done/failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # last sign of life from the worker running it
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'contact_id': self.contact_id,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': 100 if self.status == 'done' else int(self.deleted * 100 / self.total) if self.total else 0,
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f'<DeleteJob {self.id} {self.kind} contact={self.contact_id} {self.status}>'
+
+
+def _message_filter(job):
+    condition = Message.contact_id == job.contact_id
+    if job.through_message_id is not None:
+        condition = condition & (Message.id <= job.through_message_id)
+    return condition
+
+
+def enqueue_history_clear(contact):
+    """Hide a contact's current messages now and queue their deletion.
+
+    Returns the job, or None when there is nothing to delete. The caller commits.
+    """
+    through_id, total = db.session.query(
+        db.func.max(Message.id), db.func.count(Message.id)
+    ).filter(Message.contact_id == contact.id).one()
+
+    contact.last_chat = None
+    contact.unread_count = 0
+    if contact.message_status != 'Archived':
+        contact.message_status = 'Read'
+    if through_id is None:
+        return None
+
+    contact.cleared_through_id = through_id
+    job = DeleteJob(kind='chat_history', contact_id=contact.id, through_message_id=through_id, total=total)
+    db.session.add(job)
+    return job
+
+
+def enqueue_contact_delete(contact):
+    """Hide a contact now and queue deletion of its messages and the contact row.
+
+    The caller commits.
+    """
+    total = db.session.query(db.func.count(Message.id)).filter(Message.contact_id == contact.id).scalar()
+    contact.deleted_at = datetime.utcnow()
+    job = DeleteJob(kind='contact', contact_id=contact.id, total=total)
+    db.session.add(job)
+    return job
+
+
+def reclaim_stale_jobs():
+    """Put running jobs whose worker stopped making progress back to pending.
+
+    Jobs keep what they have deleted so far. Returns how many were reclaimed.
+    """
+    cutoff = datetime.utcnow() - STALE_JOB_AGE
+    reclaimed = db.session.execute(
+        db.update(DeleteJob)
+        .where(
+            DeleteJob.status == 'running',
+            DeleteJob.heartbeat_at.is_(None) | (DeleteJob.heartbeat_at < cutoff),
+        )
+        .values(status='pending')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return reclaimed
+
+
+def _claim_next_job():
+    """Atomically move the oldest pending job to running; None if there is none."""
+    while True:
+        job_id = db.session.query(DeleteJob.id).filter_by(status='pending').order_by(DeleteJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+
+        claimed = db.session.execute(
+            db.update(DeleteJob)
+            .where(DeleteJob.id == job_id, DeleteJob.status == 'pending')
+            .values(status='running', heartbeat_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(DeleteJob, job_id)
+        # Another worker claimed it first; try the next one
+
+
+def run_job(job):
+    """Delete a job's messages chunk by chunk, then the contact for contact jobs."""
+    try:
+        while True:
+            chunk = db.select(Message.id).where(_message_filter(job)).limit(DELETE_CHUNK_SIZE)
+            deleted = db.session.execute(
+                db.delete(Message)
+                .where(Message.id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            job.deleted += deleted
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            if deleted < DELETE_CHUNK_SIZE:
+                break
+            time.sleep(DELETE_CHUNK_PAUSE)
+
+        if job.kind == 'contact':
+            db.session.execute(db.delete(Contact).where(Contact.id == job.contact_id))
+
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+class DeleteWorker:
+    """Daemon thread that runs pending DeleteJobs for one process."""
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="delete-worker", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Start the worker if needed and wake it up to look for jobs."""
+        self.start()
+        self._wake.set()
+
+    def _poll(self):
+        with self.app.app_context():
+            try:
+                reclaim_stale_jobs()
+                job = _claim_next_job()
+                while job is not None:
+                    run_job(job)
+                    job = _claim_next_job()
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        # Poll once straight away for jobs left from before a restart
+        while True:
+            try:
+                self._poll()
+            except Exception:
+                logger.exception("Delete worker poll failed")
+            self._wake.wait(WORKER_IDLE_POLL)
+            self._wake.clear()
+
+
+def init_delete_worker(app):
+    """Create and start this process's delete worker; call once the tables exist."""
+    worker = app.extensions['delete_worker'] = DeleteWorker(app)
+    worker.start()
+
+
+def notify_delete_worker(app):
+    app.extensions['delete_worker'].notify()
@@ -0,0 +1,121 @@
+"""
+Offline geocoding and distance helpers for in-person activities.
+
+Locations are matched against a local gazetteer (data/gazetteer.csv), so
+no network lookup is needed. Located activities also store a geohash of
+their coordinates: a radius search first narrows the table to the few
+geohash cells covering the circle, which are prefix range scans on an
+index, and only computes exact distances for what is left.
+"""
+
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv")
+
+GEOHASH_PRECISION = 9  # cells of about 5 x 5 m
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path=GAZETTEER_PATH):
+    """{normalized name: (name, latitude, longitude)}, read once per process."""
+    with open(path, newline="", encoding="utf-8") as stream:
+        return {
+            _normalize(row["name"]): (row["name"], float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(stream)
+        }
+
+
+def place_names():
+    return sorted(name for name, _, _ in load_gazetteer().values())
+
+
+def geocode(location):
+    """(latitude, longitude) for a free-text location, or None if no place matches.
+
+    An exact place name wins; otherwise the longest place name appearing as
+    whole words in the text, so "Toa Payoh Library" finds Toa Payoh.
+    """
+    text = _normalize(location)
+    if not text:
+        return None
+    places = load_gazetteer()
+    if text not in places:
+        padded = f" {text} "
+        matches = [name for name in places if f" {name} " in padded]
+        if not matches:
+            return None
+        text = max(matches, key=len)
+    _, latitude, longitude = places[text]
+    return latitude, longitude
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        bounds, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def _cell_degrees(precision):
+    # (latitude, longitude) size of a cell; longitude gets the odd bit
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells together contain the circle.
+
+    Picks the finest precision whose cells are at least radius_km across,
+    so the centre cell and its eight neighbours cover the whole circle.
+    """
+    lon_km_per_degree = KM_PER_DEGREE * math.cos(math.radians(latitude))
+    precision = 1
+    for candidate in range(2, GEOHASH_PRECISION + 1):
+        lat_degrees, lon_degrees = _cell_degrees(candidate)
+        if lat_degrees * KM_PER_DEGREE < radius_km or lon_degrees * lon_km_per_degree < radius_km:
+            break
+        precision = candidate
+
+    lat_degrees, lon_degrees = _cell_degrees(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lon_step in (-1, 0, 1):
+            cell_latitude = min(max(latitude + lat_step * lat_degrees, -90.0), 90.0)
+            cell_longitude = (longitude + lon_step * lon_degrees + 180) % 360 - 180
+            cells.add(geohash_encode(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in km."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
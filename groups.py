@@ -1,5 +1,12 @@
 from extensions import db
+from collections import namedtuple
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+from tags import group_tag
+
+FEED_PAGE_SIZE = 10
+FEED_COMMENTS_PER_POST = 3
+COMMENTS_PAGE_SIZE = 20
 
 class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,7 +16,9 @@ class Group(db.Model):
 
     # Fields for the design
     image_url = db.Column(db.String(200), default="default_group.jpg")
-    tags = db.Column(db.String(200))
+    # Written through tags.set_group_tags()
+    tags = db.relationship("Tag", secondary=group_tag, order_by=group_tag.c.position,
+                           viewonly=True, lazy="selectin")
 
     current_participants = db.Column(db.Integer, default=0)
     max_participants = db.Column(db.Integer, default=40)
@@ -17,6 +26,12 @@ class Group(db.Model):
     # 0 to 100 representing percentage of Youth
     youth_percentage = db.Column(db.Integer, default=50)
 
+    # Kept in step with group_member by add_group_member()/remove_group_member();
+    # `flask reconcile-group-counts` rebuilds them
+    member_count = db.Column(db.Integer, nullable=False, default=0)
+    youth_count = db.Column(db.Integer, nullable=False, default=0)
+    senior_count = db.Column(db.Integer, nullable=False, default=0)
+
     # New fields for buddy system and privacy
     buddy_system_enabled = db.Column(db.Boolean, default=True)
     privacy = db.Column(db.String(20), default="Public")  # Public or Private
@@ -30,7 +45,7 @@ class Group(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def get_tags_list(self):
-        return self.tags.split(',') if self.tags else []
+        return [tag.name for tag in self.tags]
 
     def get_demo_group_key(self):
         """Identify known demo groups by name."""
@@ -59,85 +74,60 @@ class Group(db.Model):
 
         return base_youth_by_demo_group.get(demo_group_key)
 
-    def calculate_youth_percentage(self):
-        """Calculate the actual youth percentage based on group members' age categories"""
-        from users import User
-
-        # Demo groups use hardcoded base ratios plus demo-only join adjustments.
-        if self.is_demo:
-            base_youth_percentage = self.get_demo_base_youth_percentage()
-            if base_youth_percentage is None:
-                return self.youth_percentage
-
-            from flask import has_request_context, session
-
-            # Without a request/user, show the hardcoded base ratio.
-            if not has_request_context():
-                return base_youth_percentage
-
-            current_user_name = session.get('user_name', None)
-            if not current_user_name:
-                return base_youth_percentage
-
-            # Apply "joined user" adjustment only when the current user is in the group.
-            member = GroupMember.query.filter_by(
-                group_id=self.id,
-                user_name=current_user_name
-            ).first()
-            if not member:
-                return base_youth_percentage
-
-            current_user = User.query.filter_by(full_name=current_user_name).first()
-            if not current_user or not current_user.age_category:
-                return base_youth_percentage
-
-            age_category = current_user.age_category.strip().lower()
-            base_senior_percentage = 100 - base_youth_percentage
-
-            if age_category.startswith("senior"):
-                # If seniors are minority, +4 senior points; otherwise +1.
-                senior_delta = 1 if base_senior_percentage >= base_youth_percentage else 4
-                adjusted_senior_percentage = min(100, base_senior_percentage + senior_delta)
-                return max(0, 100 - adjusted_senior_percentage)
-
-            if age_category.startswith("youth"):
-                # If youths are minority, +4 youth points; otherwise +1.
-                youth_delta = 1 if base_youth_percentage >= base_senior_percentage else 4
-                return min(100, base_youth_percentage + youth_delta)
+    def get_demo_youth_percentage(self, viewer_age_category=None):
+        """Base youth percentage of a demo group, nudged when the viewer has joined it.
 
+        viewer_age_category is the current user's age category if they are a
+        member, otherwise None.
+        """
+        base_youth_percentage = self.get_demo_base_youth_percentage()
+        if base_youth_percentage is None:
+            return self.youth_percentage
+        if not viewer_age_category:
             return base_youth_percentage
 
-        # Get all members of this group
-        members = GroupMember.query.filter_by(group_id=self.id).all()
+        age_category = viewer_age_category.strip().lower()
+        base_senior_percentage = 100 - base_youth_percentage
 
-        if not members:
-            return 50  # Default if no members
+        if age_category.startswith("senior"):
+            # If seniors are minority, +4 senior points; otherwise +1.
+            senior_delta = 1 if base_senior_percentage >= base_youth_percentage else 4
+            adjusted_senior_percentage = min(100, base_senior_percentage + senior_delta)
+            return max(0, 100 - adjusted_senior_percentage)
 
-        youth_count = 0
-        senior_count = 0
+        if age_category.startswith("youth"):
+            # If youths are minority, +4 youth points; otherwise +1.
+            youth_delta = 1 if base_youth_percentage >= base_senior_percentage else 4
+            return min(100, base_youth_percentage + youth_delta)
 
-        for member in members:
-            # Find the user by full_name (user_name stores full_name)
-            user = User.query.filter_by(full_name=member.user_name).first()
-            if user:
-                if user.age_category == 'Youth':
-                    youth_count += 1
-                elif user.age_category == 'Seniors':
-                    senior_count += 1
+        return base_youth_percentage
 
-        total_counted = youth_count + senior_count
+    def calculate_youth_percentage(self, viewer_age_category=None):
+        """Youth percentage of the group's members, from the stored counters.
 
+        Demo groups use hardcoded base ratios plus demo-only join adjustments.
+        """
+        if self.is_demo:
+            return self.get_demo_youth_percentage(viewer_age_category)
+
+        total_counted = (self.youth_count or 0) + (self.senior_count or 0)
         if total_counted == 0:
             return 50  # Default if no youth or seniors
 
-        # Calculate percentage of youth
-        return int((youth_count / total_counted) * 100)
+        return int((self.youth_count / total_counted) * 100)
 
 
 class GroupMember(db.Model):
+    __table_args__ = (
+        db.Index('ix_group_member_group_user', 'group_id', 'user_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
-    user_name = db.Column(db.String(100), nullable=False)  # For demo purposes
+    # user_id is None only for the seeded demo members, who have no account
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    user = db.relationship("User")
+    user_name = db.Column(db.String(100), nullable=False)  # Display name
     buddy_id = db.Column(db.Integer, db.ForeignKey('group_member.id'), nullable=True)
     mood_status = db.Column(db.String(50), default="😊")
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -146,6 +136,7 @@ class GroupMember(db.Model):
 class BuddyQuizResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     user_name = db.Column(db.String(100), nullable=False)
     answer = db.Column(db.String(50), nullable=False)  # new_skills, sharing, conversations, explore
     matched_buddy_name = db.Column(db.String(100), nullable=True)
@@ -153,18 +144,37 @@ class BuddyQuizResponse(db.Model):
 
 
 class GroupPost(db.Model):
+    __table_args__ = (
+        db.Index('ix_group_post_group_created', 'group_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     author = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(200), nullable=True)
-    likes = db.Column(db.Integer, default=0)
+    # Kept in step with group_post_like by add_post_like()/remove_post_like()
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class GroupPostLike(db.Model):
+    __tablename__ = 'group_post_like'
+
+    post_id = db.Column(db.Integer, db.ForeignKey('group_post.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class GroupComment(db.Model):
+    __table_args__ = (
+        db.Index('ix_group_comment_post_created', 'post_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('group_post.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     author = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -173,6 +183,252 @@ class GroupComment(db.Model):
 class GroupChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     username = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# A post's newest comments, oldest first; older_cursor is None when all are shown
+PostComments = namedtuple("PostComments", ["comments", "total", "older_cursor"])
+
+
+def encode_feed_cursor(row):
+    """Cursor for a post's or comment's (created_at, id) position."""
+    return f"{row.created_at.isoformat()}|{row.id}"
+
+
+def decode_feed_cursor(cursor):
+    """Parse a cursor from encode_feed_cursor(); raises ValueError if malformed."""
+    created_at, row_id = cursor.rsplit("|", 1)
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def _before_position(model, position):
+    # Strictly older than a (created_at, id) position
+    created_at, row_id = position
+    return (model.created_at < created_at) | ((model.created_at == created_at) & (model.id < row_id))
+
+
+def get_feed_page(group_id, before=None, limit=FEED_PAGE_SIZE):
+    """Return (posts newest-first, older_cursor) for one page of a group's feed.
+
+    older_cursor is None once the oldest post is reached.
+    """
+    query = GroupPost.query.filter(GroupPost.group_id == group_id)
+    if before:
+        query = query.filter(_before_position(GroupPost, before))
+
+    rows = query.order_by(GroupPost.created_at.desc(), GroupPost.id.desc()).limit(limit + 1).all()
+    older_cursor = encode_feed_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], older_cursor
+
+
+def latest_comments(post_ids, per_post=FEED_COMMENTS_PER_POST):
+    """{post_id: PostComments} with each post's newest comments, in one query.
+
+    A window over group_comment ranks each post's comments and counts them,
+    so the number of rows fetched is bounded by per_post, not by how many
+    comments the posts have.
+    """
+    comments = {post_id: [] for post_id in post_ids}
+    totals = dict.fromkeys(comments, 0)
+    if not comments:
+        return {}
+
+    ranked = (
+        db.select(
+            GroupComment.id,
+            db.func.row_number().over(
+                partition_by=GroupComment.post_id,
+                order_by=(GroupComment.created_at.desc(), GroupComment.id.desc()),
+            ).label("rank"),
+            db.func.count().over(partition_by=GroupComment.post_id).label("total"),
+        )
+        .where(GroupComment.post_id.in_(comments))
+        .subquery()
+    )
+    rows = (
+        db.session.query(GroupComment, ranked.c.total)
+        .join(ranked, ranked.c.id == GroupComment.id)
+        .filter(ranked.c.rank <= per_post)
+        .order_by(GroupComment.post_id, GroupComment.created_at, GroupComment.id)
+    )
+    for comment, total in rows:
+        comments[comment.post_id].append(comment)
+        totals[comment.post_id] = total
+
+    return {
+        post_id: PostComments(
+            shown,
+            totals[post_id],
+            encode_feed_cursor(shown[0]) if totals[post_id] > len(shown) else None,
+        )
+        for post_id, shown in comments.items()
+    }
+
+
+def get_comments_page(post_id, before, limit=COMMENTS_PAGE_SIZE):
+    """Return (comments oldest-first, older_cursor) for the comments before a position."""
+    rows = (
+        GroupComment.query.filter(GroupComment.post_id == post_id, _before_position(GroupComment, before))
+        .order_by(GroupComment.created_at.desc(), GroupComment.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    older_cursor = encode_feed_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return list(reversed(rows[:limit])), older_cursor
+
+
+def add_post_like(post, user_id):
+    """Like a post as user_id in one transaction; False if they already liked it.
+
+    The primary key rejects a second like, and the counter is bumped with
+    an atomic UPDATE, so concurrent likes cannot lose a count. Commits or
+    rolls back.
+    """
+    post_id = post.id
+    try:
+        db.session.execute(db.insert(GroupPostLike).values(post_id=post_id, user_id=user_id))
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+    db.session.execute(
+        db.update(GroupPost)
+        .where(GroupPost.id == post_id)
+        .values(likes=GroupPost.likes + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return True
+
+
+def remove_post_like(post, user_id):
+    """Take back user_id's like of a post; False if they had not liked it. Commits."""
+    post_id = post.id
+    removed = db.session.execute(
+        db.delete(GroupPostLike)
+        .where(GroupPostLike.post_id == post_id, GroupPostLike.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if removed:
+        db.session.execute(
+            db.update(GroupPost)
+            .where(GroupPost.id == post_id, GroupPost.likes > 0)
+            .values(likes=GroupPost.likes - 1)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return bool(removed)
+
+
+def liked_post_ids(user_id, post_ids):
+    """The ids among post_ids that user_id has liked."""
+    if not post_ids:
+        return set()
+    return set(
+        db.session.scalars(
+            db.select(GroupPostLike.post_id)
+            .where(GroupPostLike.user_id == user_id, GroupPostLike.post_id.in_(post_ids))
+        )
+    )
+
+
+def member_age_counts(group_ids):
+    """{group_id: (youth_count, senior_count)} for the given groups, in one query.
+
+    Members without an account (demo rows) are not counted; groups
+    without counted members get (0, 0).
+    """
+    from users import User
+
+    counts = {group_id: (0, 0) for group_id in group_ids}
+    if not counts:
+        return counts
+
+    rows = (
+        db.session.query(
+            GroupMember.group_id,
+            db.func.sum(db.case((User.age_category == 'Youth', 1), else_=0)),
+            db.func.sum(db.case((User.age_category == 'Seniors', 1), else_=0)),
+        )
+        .join(User, User.id == GroupMember.user_id)
+        .filter(GroupMember.group_id.in_(counts))
+        .group_by(GroupMember.group_id)
+    )
+    for group_id, youth_count, senior_count in rows:
+        counts[group_id] = (youth_count, senior_count)
+    return counts
+
+
+# Age categories with a counter on Group
+AGE_COUNT_COLUMNS = {'Youth': 'youth_count', 'Seniors': 'senior_count'}
+COUNT_COLUMNS = ['member_count', 'youth_count', 'senior_count']
+
+
+def _update_counts(group, age_category, step):
+    # Atomic increments, so concurrent joins and leaves cannot lose a count
+    values = {'member_count': Group.member_count + step}
+    column = AGE_COUNT_COLUMNS.get(age_category)
+    if column:
+        values[column] = getattr(Group, column) + step
+
+    db.session.execute(
+        db.update(Group)
+        .where(Group.id == group.id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(group, COUNT_COLUMNS)
+
+
+def add_group_member(group, user, **fields):
+    """Add a User to a group, updating its counters in the same transaction.
+
+    Returns the new member, or None if the user is already a member (for
+    example joined by a concurrent request); the counters then stay as
+    they are. The group must have an id (flush it first). The caller commits.
+    """
+    try:
+        with db.session.begin_nested():
+            member = GroupMember(group_id=group.id, user_id=user.id, user_name=user.full_name, **fields)
+            db.session.add(member)
+    except IntegrityError:
+        # The unique (group_id, user_id) index rejected a second membership
+        return None
+    _update_counts(group, user.age_category, 1)
+    return member
+
+
+def remove_group_member(group, member):
+    """Remove a member from a group, updating its counters. The caller commits."""
+    db.session.delete(member)
+    _update_counts(group, member.user.age_category if member.user else None, -1)
+
+
+def reconcile_group_counts(group_ids=None):
+    """Rebuild the member, youth and senior counters from group_member.
+
+    Counters record age categories as they were at join time, so they can
+    drift when users change category. Returns how many
+    groups were corrected. The caller commits.
+    """
+    query = Group.query if group_ids is None else Group.query.filter(Group.id.in_(group_ids))
+    groups = query.all()
+    group_ids = [group.id for group in groups]
+
+    age_counts = member_age_counts(group_ids)
+    member_counts = dict(
+        db.session.query(GroupMember.group_id, db.func.count(GroupMember.id))
+        .filter(GroupMember.group_id.in_(group_ids))
+        .group_by(GroupMember.group_id)
+    )
+
+    corrected = 0
+    for group in groups:
+        counts = (member_counts.get(group.id, 0),) + age_counts[group.id]
+        if (group.member_count, group.youth_count, group.senior_count) != counts:
+            group.member_count, group.youth_count, group.senior_count = counts
+            corrected += 1
+    return corrected
@@ -0,0 +1,111 @@
+"""
+Load test for joining and leaving activities concurrently.
+
+Many threads join one activity with a few free places at the same moment,
+then leave it again, against a throwaway SQLite file database (the app's
+own database is never touched). Exactly the free places must be taken and
+Activity.participants must always match the participant rows.
+
+Run with: python load_test_joins.py [joiners] [free_places]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+
+from flask import Flask
+
+from extensions import db
+from users import User
+from activities import (Activity, ActivityParticipant, add_participant, remove_participant,
+                        JOINED, ACTIVITY_FULL)
+# The other model modules, so create_all() can resolve foreign keys between them
+import delete_jobs, groups, messages, posts, reports, tags  # noqa: F401
+
+
+def scratch_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def run_together(app, keys, action):
+    """Call action(key) from one thread per key, all released at once; returns {key: result}."""
+    barrier = threading.Barrier(len(keys))
+    results = {}
+
+    def worker(key):
+        with app.app_context():
+            barrier.wait()
+            results[key] = action(key)
+
+    threads = [threading.Thread(target=worker, args=(key,)) for key in keys]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def counter_and_rows(activity_id):
+    participants = db.session.get(Activity, activity_id).participants
+    rows = ActivityParticipant.query.filter_by(activity_id=activity_id).count()
+    return participants, rows
+
+
+def main(joiners=50, free_places=5):
+    with tempfile.TemporaryDirectory() as directory:
+        app = scratch_app(os.path.join(directory, 'load_test.db'))
+
+        with app.app_context():
+            users = [
+                User(full_name=f"Joiner {i}", email=f"joiner{i}@example.com", mobile="80000000",
+                     date_of_birth=date(1990, 1, 1), age_category="Others", password_hash="!",
+                     user_unique_id=f"USR-{i:06d}")
+                for i in range(joiners + 1)
+            ]
+            db.session.add_all(users)
+            db.session.flush()
+
+            # The creator holds one place, as when an activity is created
+            creator, joiner_ids = users[0], [user.id for user in users[1:]]
+            activity = Activity(creator_id=creator.id, name="Load test", date=date.today() + timedelta(days=7),
+                                participants=1, max_participants=free_places + 1)
+            db.session.add(activity)
+            db.session.commit()
+            activity_id = activity.id
+
+        def join(user_id):
+            return add_participant(db.session.get(Activity, activity_id), user_id)
+
+        def leave(user_id):
+            return remove_participant(db.session.get(Activity, activity_id), user_id)
+
+        results = run_together(app, joiner_ids, join)
+        joined = [user_id for user_id, result in results.items() if result == JOINED]
+        full = sum(result == ACTIVITY_FULL for result in results.values())
+        with app.app_context():
+            participants, rows = counter_and_rows(activity_id)
+        print(f"{joiners} joiners, {free_places} free places: {len(joined)} joined, {full} full")
+        print(f"participants counter {participants}, participant rows {rows}")
+        assert len(joined) == free_places and full == joiners - free_places
+        assert participants == free_places + 1 and rows == free_places
+
+        # Everyone leaves at once, including those who never got in
+        results = run_together(app, joiner_ids, leave)
+        with app.app_context():
+            participants, rows = counter_and_rows(activity_id)
+        print(f"after leaving: {sum(results.values())} left, participants counter {participants}, rows {rows}")
+        assert sorted(user_id for user_id, left in results.items() if left) == sorted(joined)
+        assert participants == 1 and rows == 0
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,81 @@
+"""
+Load test for liking group posts concurrently.
+
+Every liker likes one post from two threads at the same moment (a double
+click), then half of them take their like back while the rest try to like
+again, against a throwaway SQLite file database. GroupPost.likes must
+match the like rows after each round, with one like per user.
+
+Run with: python load_test_likes.py [likers]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+
+from extensions import db
+from users import User
+from groups import Group, GroupPost, GroupPostLike, add_post_like, remove_post_like
+from load_test_joins import scratch_app, run_together
+
+
+def likes_and_rows(post_id):
+    likes = db.session.get(GroupPost, post_id).likes
+    rows = GroupPostLike.query.filter_by(post_id=post_id).count()
+    return likes, rows
+
+
+def main(likers=40):
+    with tempfile.TemporaryDirectory() as directory:
+        app = scratch_app(os.path.join(directory, 'load_test.db'))
+
+        with app.app_context():
+            users = [
+                User(full_name=f"Liker {i}", email=f"liker{i}@example.com", mobile="80000000",
+                     date_of_birth=date(1990, 1, 1), age_category="Others", password_hash="!",
+                     user_unique_id=f"USR-{i:06d}")
+                for i in range(likers)
+            ]
+            group = Group(name="Load test")
+            db.session.add_all(users + [group])
+            db.session.flush()
+            post = GroupPost(group_id=group.id, user_id=users[0].id, author=users[0].full_name, content="Like me")
+            db.session.add(post)
+            db.session.commit()
+            post_id, user_ids = post.id, [user.id for user in users]
+
+        def like(attempt):
+            user_id, _ = attempt
+            return add_post_like(db.session.get(GroupPost, post_id), user_id)
+
+        # Two clicks per user, all at once: only one of each pair counts
+        results = run_together(app, [(user_id, click) for user_id in user_ids for click in (1, 2)], like)
+        with app.app_context():
+            likes, rows = likes_and_rows(post_id)
+        print(f"{likers} likers, 2 clicks each: {sum(results.values())} likes recorded")
+        print(f"likes counter {likes}, like rows {rows}")
+        assert all(results[(user_id, 1)] != results[(user_id, 2)] for user_id in user_ids)
+        assert likes == rows == likers
+
+        # Half take their like back while the other half like again
+        unlikers = set(user_ids[::2])
+
+        def toggle(user_id):
+            post = db.session.get(GroupPost, post_id)
+            if user_id in unlikers:
+                return remove_post_like(post, user_id)
+            return add_post_like(post, user_id)
+
+        results = run_together(app, user_ids, toggle)
+        with app.app_context():
+            likes, rows = likes_and_rows(post_id)
+        print(f"after {len(unlikers)} unlikes: likes counter {likes}, like rows {rows}")
+        assert all(results[user_id] == (user_id in unlikers) for user_id in user_ids)
+        assert likes == rows == likers - len(unlikers)
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
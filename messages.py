@@ -1,14 +1,50 @@
 from extensions import db
 from datetime import datetime
+from collections import namedtuple, defaultdict
+import re
 import pytz
-from sqlalchemy import exc
+from markupsafe import Markup, escape
+from sqlalchemy import exc, event
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+INBOX_PAGE_SIZE = 50
+CHAT_PAGE_SIZE = 50
+CHAT_WINDOW_RADIUS = 20
+
+# Markers FTS5 wraps around matched terms; swapped for <mark> after escaping
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+# Full-text index over message.content (external content table + sync triggers)
+MESSAGE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts "
+    "USING fts5(content, content='message', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+    "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+# One search result: the message and its highlighted snippet
+SearchHit = namedtuple("SearchHit", ["message", "snippet"])
+
+# One row of the /messages inbox
+InboxEntry = namedtuple("InboxEntry", ["contact", "last_chat", "unread_count"])
 
 class Contact(db.Model):
     __tablename__ = 'contact'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(35), nullable=False)
     phone = db.Column(db.String(8), nullable=False)
-    __table_args__ = (db.UniqueConstraint('phone', name='uq_contact_phone'),)
+    __table_args__ = (
+        db.UniqueConstraint('phone', name='uq_contact_phone'),
+        db.Index('ix_contact_status_last_chat', 'message_status', 'last_chat'),
+    )
     short_desc = db.Column(db.String(120))
     image_url = db.Column(db.String(200), default='default_contact.jpg')  # Added default
     
@@ -19,7 +55,12 @@ class Contact(db.Model):
     chat_group = db.Column(db.String(50), default='General')  # Added default
     message_status = db.Column(db.String(20), default='Unread')  # Added default
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Added creation timestamp
-    last_chat = db.Column(db.DateTime)  # Add this field for last message timestamp
+    last_chat = db.Column(db.DateTime, index=True)  # Kept in sync by the Message write hooks below
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Same
+
+    # Set while a background DeleteJob removes the data (see delete_jobs.py)
+    deleted_at = db.Column(db.DateTime, index=True)  # contact is hidden everywhere
+    cleared_through_id = db.Column(db.Integer)  # messages up to this id are hidden
     
     def __repr__(self):
         return f'<Contact {self.name} ({self.phone})>'
@@ -41,10 +82,443 @@ class Message(db.Model):
 
     # Status tracking
     status = db.Column(db.String(20), default='Delivered')  # e.g., Delivered, Read
+
+    # Serves "newest message per contact" and per-chat history lookups.
+    # AUTOINCREMENT: ids are never reused, which Contact.cleared_through_id relies on.
+    __table_args__ = (
+        db.Index('ix_message_contact_timestamp', 'contact_id', 'timestamp'),
+        {'sqlite_autoincrement': True},
+    )
     
     @property
     def date_only(self):
         return self.timestamp.date() if self.timestamp else None
     
     def __repr__(self):
-        return f'<Message {self.id} from {self.username}>'
\ No newline at end of file
+        return f'<Message {self.id} from {self.username}>'
+
+
+def validate_contact(name, phone, short_desc):
+    """Field rules for a new contact. Returns {field: message}; uniqueness is checked by callers."""
+    errors = {}
+
+    # Validate name
+    if not name:
+        errors["name"] = "Name is required."
+    elif len(name) > 35:
+        errors["name"] = "Name cannot exceed 35 characters."
+
+    # Validate phone
+    if not phone:
+        errors["phone"] = "Phone number is required."
+    elif len(phone) != 8 or not phone.isdigit():
+        errors["phone"] = "Phone number must be exactly 8 digits."
+
+    # Validate short description
+    if short_desc and len(short_desc) > 120:
+        errors["short_desc"] = "Short description cannot exceed 120 characters."
+
+    return errors
+
+
+def is_unread(status):
+    return status != 'Read'
+
+
+def sent_from_app(username):
+    """SQL condition: a message's username belongs to a ShareJoy account.
+
+    Those are the user's own outgoing messages; only messages from the
+    contact count as unread.
+    """
+    from users import User
+
+    return db.exists().where(User.full_name == username)
+
+
+def _is_incoming(connection, username):
+    return not connection.execute(db.select(sent_from_app(username))).scalar()
+
+
+def inbox_status(unread_count):
+    """SQL expression for contact.message_status given a new unread count.
+
+    Archived contacts stay archived; otherwise the status follows the count.
+    """
+    return db.case(
+        (Contact.message_status == 'Archived', Contact.message_status),
+        (unread_count > 0, 'Unread'),
+        else_='Read',
+    )
+
+
+def _sync_contact(connection, session, contact_id, message_id, unread_delta=0):
+    """Refresh a contact's stored inbox columns on the flush connection.
+
+    last_chat is recomputed from the newest visible message and unread_count
+    is moved by unread_delta, in the same transaction as the message change.
+    A message hidden by a history clear was already taken off the count, so
+    its delta is ignored.
+    """
+    last_chat = connection.execute(
+        db.select(db.func.max(Message.timestamp)).where(in_visible_chat(contact_id))
+    ).scalar()
+    values = {"last_chat": last_chat}
+    if unread_delta:
+        visible_delta = db.case((Contact.cleared_through_id >= message_id, 0), else_=unread_delta)
+        new_unread = db.case(
+            (Contact.unread_count + visible_delta > 0, Contact.unread_count + visible_delta),
+            else_=0,
+        )
+        values["unread_count"] = new_unread
+        values["message_status"] = inbox_status(new_unread)
+
+    connection.execute(db.update(Contact).where(Contact.id == contact_id).values(**values))
+
+    # Keep an already-loaded Contact in step without marking it dirty
+    contact = session.identity_map.get(identity_key(Contact, contact_id)) if session else None
+    if contact is not None:
+        row = connection.execute(
+            db.select(Contact.last_chat, Contact.unread_count, Contact.message_status)
+            .where(Contact.id == contact_id)
+        ).one_or_none()
+        if row is not None:
+            for key, value in row._mapping.items():
+                set_committed_value(contact, key, value)
+
+
+@event.listens_for(Message, "after_insert")
+def _message_inserted(mapper, connection, target):
+    unread = is_unread(target.status) and _is_incoming(connection, target.username)
+    _sync_contact(connection, object_session(target), target.contact_id, target.id, unread_delta=int(unread))
+
+
+@event.listens_for(Message, "after_delete")
+def _message_deleted(mapper, connection, target):
+    unread = is_unread(target.status) and _is_incoming(connection, target.username)
+    _sync_contact(connection, object_session(target), target.contact_id, target.id, unread_delta=-int(unread))
+
+
+@event.listens_for(Message, "after_update")
+def _message_updated(mapper, connection, target):
+    state = db.inspect(target)
+    old_contact_id = (state.attrs.contact_id.history.deleted or [target.contact_id])[0]
+    old_status = (state.attrs.status.history.deleted or [target.status])[0]
+
+    unread_deltas = defaultdict(int)
+    if _is_incoming(connection, target.username):
+        unread_deltas[old_contact_id] -= int(is_unread(old_status))
+        unread_deltas[target.contact_id] += int(is_unread(target.status))
+    for contact_id, unread_delta in unread_deltas.items():
+        _sync_contact(connection, object_session(target), contact_id, target.id, unread_delta)
+
+
+def mark_read(contact, position):
+    """Mark every visible incoming message up to a (timestamp, id) position as read.
+
+    One UPDATE flips the messages; the contact's unread counter and status
+    are adjusted in the same transaction. Returns the number of messages
+    marked. The caller commits.
+    """
+    result = db.session.execute(
+        db.update(Message)
+        .where(
+            in_visible_chat(contact.id),
+            ~after_position(position),
+            ~sent_from_app(Message.username),
+            db.or_(Message.status.is_(None), Message.status != 'Read'),
+        )
+        .values(status='Read')
+        .execution_options(synchronize_session=False)
+    )
+    marked = result.rowcount
+
+    if marked:
+        new_unread = db.case((Contact.unread_count > marked, Contact.unread_count - marked), else_=0)
+        db.session.execute(
+            db.update(Contact)
+            .where(Contact.id == contact.id)
+            .values(unread_count=new_unread, message_status=inbox_status(new_unread))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(contact, ["unread_count", "message_status"])
+
+    return marked
+
+
+def backfill_inbox_columns():
+    """One-off: set last_chat, unread_count and message_status from existing messages.
+
+    Returns the number of contacts updated.
+    """
+    newest = (
+        db.select(db.func.max(Message.timestamp))
+        .where(Message.contact_id == Contact.id)
+        .scalar_subquery()
+    )
+    unread = (
+        db.select(db.func.count(Message.id))
+        .where(
+            Message.contact_id == Contact.id,
+            ~sent_from_app(Message.username),
+            db.or_(Message.status.is_(None), Message.status != 'Read'),
+        )
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        db.update(Contact).values(last_chat=newest, unread_count=unread, message_status=inbox_status(unread))
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def create_message_search_index():
+    """Create the FTS5 table and its triggers if they do not exist yet."""
+    for statement in MESSAGE_FTS_DDL:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+def rebuild_message_search_index():
+    """Re-index every message from the message table."""
+    db.session.execute(db.text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+
+def fts_query(term):
+    """Turn user input into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", term or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def message_matches(term):
+    """Subquery of (id, rank, snippet) for messages matching a search term."""
+    return (
+        db.text(
+            "SELECT rowid AS id, rank, "
+            "snippet(message_fts, 0, :start, :end, '…', 12) AS snippet "
+            "FROM message_fts WHERE message_fts MATCH :query"
+        )
+        .bindparams(query=fts_query(term), start=SNIPPET_START, end=SNIPPET_END)
+        .columns(id=db.Integer, rank=db.Float, snippet=db.Text)
+        .subquery()
+    )
+
+
+def highlight_snippet(snippet):
+    """Escape a snippet and mark up the matched terms."""
+    return Markup(
+        str(escape(snippet))
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+def search_messages(term, contact_id=None, status=None, chronological=False, limit=50):
+    """Full-text search over messages, best matches first.
+
+    With chronological=True results come oldest-first instead of by rank.
+    """
+    if not fts_query(term):
+        return []
+
+    matches = message_matches(term)
+    query = (
+        db.session.query(Message, matches.c.snippet)
+        .join(matches, matches.c.id == Message.id)
+        .join(Message.contact)
+        .options(db.contains_eager(Message.contact))
+        .filter(
+            Contact.deleted_at.is_(None),
+            Message.id > db.func.coalesce(Contact.cleared_through_id, 0),
+        )
+    )
+
+    if contact_id is not None:
+        query = query.filter(Message.contact_id == contact_id)
+    if status:
+        query = query.filter(Message.status == status)
+
+    if chronological:
+        query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+    else:
+        query = query.order_by(matches.c.rank, Message.timestamp.desc())
+
+    return [
+        SearchHit(message, highlight_snippet(snippet))
+        for message, snippet in query.limit(limit).all()
+    ]
+
+
+def encode_cursor(message):
+    """Cursor for a message's (timestamp, id) position in its chat."""
+    timestamp = message.timestamp
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(pytz.utc).replace(tzinfo=None)
+    return f"{timestamp.isoformat()}|{message.id}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor(); raises ValueError if malformed."""
+    timestamp, message_id = cursor.rsplit("|", 1)
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+
+def in_visible_chat(contact_id):
+    """Filter for a chat's messages, minus any a history clear is still deleting."""
+    cleared_through = (
+        db.select(db.func.coalesce(Contact.cleared_through_id, 0))
+        .where(Contact.id == contact_id)
+        .scalar_subquery()
+    )
+    return (Message.contact_id == contact_id) & (Message.id > cleared_through)
+
+
+def before_position(position):
+    """Filter for messages strictly older than a (timestamp, id) position."""
+    timestamp, message_id = position
+    return (Message.timestamp < timestamp) | (
+        (Message.timestamp == timestamp) & (Message.id < message_id)
+    )
+
+
+def from_position(position):
+    """Filter for messages at or newer than a (timestamp, id) position."""
+    timestamp, message_id = position
+    return (Message.timestamp > timestamp) | (
+        (Message.timestamp == timestamp) & (Message.id >= message_id)
+    )
+
+
+def after_position(position):
+    """Filter for messages strictly newer than a (timestamp, id) position."""
+    timestamp, message_id = position
+    return (Message.timestamp > timestamp) | (
+        (Message.timestamp == timestamp) & (Message.id > message_id)
+    )
+
+
+def message_position(message):
+    """A message's (timestamp, id) position within its chat."""
+    return message.timestamp, message.id
+
+
+def get_chat_page(contact_id, before=None, limit=CHAT_PAGE_SIZE):
+    """Return (messages oldest-first, older_cursor) for one page of a chat.
+
+    Keyset pagination on (timestamp, id): the page holds the newest `limit`
+    messages older than the `before` position (or the newest overall), and
+    older_cursor is None once the start of the chat is reached.
+    """
+    query = Message.query.filter(in_visible_chat(contact_id))
+    if before:
+        query = query.filter(before_position(before))
+
+    rows = (
+        query.order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    older_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return list(reversed(rows[:limit])), older_cursor
+
+
+def get_chat_window(contact_id, anchor, radius=CHAT_WINDOW_RADIUS):
+    """Return (messages, older_cursor, has_newer) for the messages around anchor.
+
+    Loads at most `radius` messages on each side of the anchor message, so
+    the cost does not depend on how long the chat is.
+    """
+    position = message_position(anchor)
+    base = Message.query.filter(in_visible_chat(contact_id))
+
+    older = (
+        base.filter(before_position(position))
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(radius + 1)
+        .all()
+    )
+    newer = (
+        base.filter(from_position(position))
+        .order_by(Message.timestamp.asc(), Message.id.asc())
+        .limit(radius + 2)
+        .all()
+    )
+
+    older_cursor = encode_cursor(older[radius - 1]) if len(older) > radius else None
+    has_newer = len(newer) > radius + 1
+    return list(reversed(older[:radius])) + newer[:radius + 1], older_cursor, has_newer
+
+
+def find_search_hit(contact_id, term, position=None, direction="next"):
+    """Next (or previous) message in a chat matching term, relative to position.
+
+    Without a position the oldest match is returned. Returns None if there
+    is no further match.
+    """
+    if not fts_query(term):
+        return None
+
+    matches = message_matches(term)
+    query = (
+        Message.query
+        .join(matches, matches.c.id == Message.id)
+        .filter(in_visible_chat(contact_id))
+    )
+
+    if direction == "previous":
+        if position is not None:
+            query = query.filter(before_position(position))
+        query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+    else:
+        if position is not None:
+            query = query.filter(after_position(position))
+        query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+
+    return query.first()
+
+
+def get_inbox(search=None, status_filter=None, page=1, per_page=INBOX_PAGE_SIZE):
+    """Return one page of inbox entries and whether a next page exists.
+
+    Contacts are sorted and paged on the indexed last_chat column and the
+    unread count is a stored column, so no message rows are read.
+    """
+    query = db.session.query(
+        Contact,
+        Contact.last_chat,
+        Contact.unread_count,
+    ).filter(Contact.deleted_at.is_(None))
+
+    if search:
+        contact_filter = (
+            (Contact.name.ilike(f"%{search}%")) |
+            (Contact.phone.ilike(f"%{search}%")) |
+            (Contact.short_desc.ilike(f"%{search}%"))
+        )
+        if fts_query(search):
+            matches = message_matches(search)
+            owner = db.aliased(Contact)
+            matching_contacts = (
+                db.select(Message.contact_id)
+                .join(matches, matches.c.id == Message.id)
+                .join(owner, owner.id == Message.contact_id)
+                .where(Message.id > db.func.coalesce(owner.cleared_through_id, 0))
+            )
+            contact_filter = contact_filter | Contact.id.in_(matching_contacts)
+        query = query.filter(contact_filter)
+
+    if status_filter:
+        query = query.filter(Contact.message_status == status_filter)
+
+    page = max(page, 1)
+    rows = (
+        query.order_by(Contact.last_chat.desc().nulls_last(), Contact.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+
+    has_next = len(rows) > per_page
+    return [InboxEntry(*row) for row in rows[:per_page]], has_next
@@ -0,0 +1,33 @@
+"""add activity coordinates
+
+Revision ID: 2a7c9e1d4b60
+Revises: 6e2b8d4f0a73
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a7c9e1d4b60'
+down_revision = '6e2b8d4f0a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows are located afterwards with `flask geocode-activities`
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geohash', sa.String(length=9), nullable=True))
+        batch_op.create_index('ix_activity_geohash', ['geohash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_geohash')
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
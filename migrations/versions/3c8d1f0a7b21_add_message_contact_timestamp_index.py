@@ -0,0 +1,26 @@
+"""add message contact/timestamp index
+
+Revision ID: 3c8d1f0a7b21
+Revises: f9b2b6c6a4d1
+Create Date: 2026-10-17 09:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8d1f0a7b21'
+down_revision = 'f9b2b6c6a4d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_contact_timestamp', ['contact_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_contact_timestamp')
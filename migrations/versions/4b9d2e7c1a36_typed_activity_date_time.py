@@ -0,0 +1,65 @@
+"""typed activity date and time
+
+Revision ID: 4b9d2e7c1a36
+Revises: e7b3f1c2a905
+Create Date: 2026-10-17 16:05:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b9d2e7c1a36'
+down_revision = 'e7b3f1c2a905'
+branch_labels = None
+depends_on = None
+
+# Formats the old String columns were written in (form input, seed data, imports)
+DATE_FORMATS = ("%Y-%m-%d", "%d %b %Y", "%m/%d/%Y", "%d/%m/%Y")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p")
+
+
+def _parse(value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+def upgrade():
+    bind = op.get_bind()
+    legacy = bind.execute(sa.text('SELECT id, date, time FROM activity')).fetchall()
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.alter_column('date', existing_type=sa.String(length=20), type_=sa.Date(), existing_nullable=True)
+        batch_op.alter_column('time', existing_type=sa.String(length=10), type_=sa.Time(), existing_nullable=True)
+        batch_op.create_index('ix_activity_date_time', ['date', 'time'], unique=False)
+
+    # Parse the legacy strings once; values matching no known format become NULL
+    activity = sa.table('activity', sa.column('id', sa.Integer), sa.column('date', sa.Date), sa.column('time', sa.Time))
+    for activity_id, date_str, time_str in legacy:
+        parsed_date = _parse(date_str, DATE_FORMATS)
+        parsed_time = _parse(time_str, TIME_FORMATS)
+        op.execute(
+            activity.update()
+            .where(activity.c.id == activity_id)
+            .values(
+                date=parsed_date.date() if parsed_date else None,
+                time=parsed_time.time() if parsed_time else None,
+            )
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_date_time')
+        batch_op.alter_column('time', existing_type=sa.Time(), type_=sa.String(length=10), existing_nullable=True)
+        batch_op.alter_column('date', existing_type=sa.Date(), type_=sa.String(length=20), existing_nullable=True)
+
+    # Back to the "YYYY-MM-DD" / "HH:MM" strings the forms produce
+    op.execute("UPDATE activity SET time = substr(time, 1, 5) WHERE time IS NOT NULL")
@@ -0,0 +1,88 @@
+"""add user_id to group membership, posts, comments, chat and quiz responses
+
+Revision ID: 4d8b2f6a1c37
+Revises: 7f3a1c5e9b24
+Create Date: 2026-10-17 22:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8b2f6a1c37'
+down_revision = '7f3a1c5e9b24'
+branch_labels = None
+depends_on = None
+
+# table -> column holding the user's full_name
+NAME_COLUMNS = {
+    'group_member': 'user_name',
+    'buddy_quiz_response': 'user_name',
+    'group_post': 'author',
+    'group_comment': 'author',
+    'group_chat_message': 'username',
+}
+
+
+def upgrade():
+    for table, name_column in NAME_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'fk_{table}_user_id', 'user', ['user_id'], ['id'])
+            batch_op.create_index(f'ix_{table}_user_id', ['user_id'], unique=False)
+
+        # full_name is not unique; the oldest account with the name wins.
+        # Names without an account (the demo members) stay NULL.
+        op.execute(f"""
+            UPDATE {table} SET user_id = (
+                SELECT MIN(user.id) FROM user WHERE user.full_name = {table}.{name_column}
+            )
+        """)
+
+    # A user is a member of a group once: keep their first membership row
+    # and point buddies at it before dropping the others
+    op.execute("""
+        UPDATE group_member SET buddy_id = (
+            SELECT MIN(kept.id) FROM group_member AS old
+            JOIN group_member AS kept ON kept.group_id = old.group_id AND kept.user_id = old.user_id
+            WHERE old.id = group_member.buddy_id
+        )
+        WHERE buddy_id IN (SELECT id FROM group_member WHERE user_id IS NOT NULL)
+    """)
+    op.execute("""
+        DELETE FROM group_member
+        WHERE user_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM group_member WHERE user_id IS NOT NULL GROUP BY group_id, user_id
+        )
+    """)
+
+    with op.batch_alter_table('group_member', schema=None) as batch_op:
+        batch_op.create_index('ix_group_member_group_user', ['group_id', 'user_id'], unique=True)
+
+    # Same counts as groups.reconcile_group_counts(), now by user_id
+    op.execute("""
+        UPDATE "group" SET
+            member_count = (
+                SELECT COUNT(*) FROM group_member WHERE group_member.group_id = "group".id
+            ),
+            youth_count = (
+                SELECT COUNT(*) FROM group_member JOIN user ON user.id = group_member.user_id
+                WHERE group_member.group_id = "group".id AND user.age_category = 'Youth'
+            ),
+            senior_count = (
+                SELECT COUNT(*) FROM group_member JOIN user ON user.id = group_member.user_id
+                WHERE group_member.group_id = "group".id AND user.age_category = 'Seniors'
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('group_member', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_member_group_user')
+
+    for table in reversed(list(NAME_COLUMNS)):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_user_id')
+            batch_op.drop_constraint(f'fk_{table}_user_id', type_='foreignkey')
+            batch_op.drop_column('user_id')
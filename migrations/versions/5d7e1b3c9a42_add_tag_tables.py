@@ -0,0 +1,122 @@
+"""add tag tables
+
+Revision ID: 5d7e1b3c9a42
+Revises: c6e2a9f4d817
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e1b3c9a42'
+down_revision = 'c6e2a9f4d817'
+branch_labels = None
+depends_on = None
+
+MAX_TAG_LENGTH = 50
+
+tag = sa.table('tag', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('slug', sa.String))
+activity_tag = sa.table('activity_tag', sa.column('activity_id', sa.Integer), sa.column('tag_id', sa.Integer),
+                        sa.column('position', sa.Integer))
+group_tag = sa.table('group_tag', sa.column('group_id', sa.Integer), sa.column('tag_id', sa.Integer),
+                     sa.column('position', sa.Integer))
+activity = sa.table('activity', sa.column('id', sa.Integer), sa.column('tags', sa.String))
+group = sa.table('group', sa.column('id', sa.Integer), sa.column('tags', sa.String))
+
+
+def _split_tags(value):
+    # Same cleaning as tags.split_tags() at the time of this migration
+    names = []
+    seen = set()
+    for raw in (value or "").split(","):
+        name = " ".join(raw.split()).lstrip("#")[:MAX_TAG_LENGTH]
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def _create_link_table(name, owner_column, owner_table):
+    op.create_table(
+        name,
+        sa.Column(owner_column, sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([owner_column], [f'{owner_table}.id']),
+        sa.ForeignKeyConstraint(['tag_id'], ['tag.id']),
+        sa.PrimaryKeyConstraint(owner_column, 'tag_id')
+    )
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        batch_op.create_index(f'ix_{name}_tag_id', ['tag_id', owner_column], unique=False)
+
+
+def upgrade():
+    bind = op.get_bind()
+    # app.py's db.create_all() may already have created the new tables
+    tables = sa.inspect(bind).get_table_names()
+    if 'tag' not in tables:
+        op.create_table(
+            'tag',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=MAX_TAG_LENGTH), nullable=False),
+            sa.Column('slug', sa.String(length=MAX_TAG_LENGTH), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('slug')
+        )
+    if 'activity_tag' not in tables:
+        _create_link_table('activity_tag', 'activity_id', 'activity')
+    if 'group_tag' not in tables:
+        _create_link_table('group_tag', 'group_id', 'group')
+
+    # Split the comma-separated columns into tag rows and links, once
+    tag_ids = {slug: tag_id for tag_id, slug in bind.execute(sa.select(tag.c.id, tag.c.slug))}
+
+    def link_rows(owner_table, owner_column):
+        rows = []
+        for owner_id, value in bind.execute(sa.select(owner_table.c.id, owner_table.c.tags)).fetchall():
+            for position, name in enumerate(_split_tags(value)):
+                slug = name.lower()
+                if slug not in tag_ids:
+                    tag_ids[slug] = bind.execute(tag.insert().values(name=name, slug=slug)).lastrowid
+                rows.append({owner_column: owner_id, 'tag_id': tag_ids[slug], 'position': position})
+        return rows
+
+    activity_links = link_rows(activity, 'activity_id')
+    group_links = link_rows(group, 'group_id')
+    if activity_links:
+        op.bulk_insert(activity_tag, activity_links)
+    if group_links:
+        op.bulk_insert(group_tag, group_links)
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_column('tags')
+
+    with op.batch_alter_table('group', schema=None) as batch_op:
+        batch_op.drop_column('tags')
+
+
+def downgrade():
+    with op.batch_alter_table('group', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.VARCHAR(length=200), nullable=True))
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.VARCHAR(length=200), nullable=True))
+
+    bind = op.get_bind()
+    for owner_table, link_table, owner_column in ((activity, activity_tag, 'activity_id'), (group, group_tag, 'group_id')):
+        names = {}
+        rows = bind.execute(
+            sa.select(link_table.c[owner_column], tag.c.name)
+            .join(tag, tag.c.id == link_table.c.tag_id)
+            .order_by(link_table.c[owner_column], link_table.c.position)
+        )
+        for owner_id, name in rows:
+            names.setdefault(owner_id, []).append(name)
+        for owner_id, owner_names in names.items():
+            bind.execute(owner_table.update().where(owner_table.c.id == owner_id).values(tags=",".join(owner_names)))
+
+    op.drop_table('group_tag')
+    op.drop_table('activity_tag')
+    op.drop_table('tag')
@@ -0,0 +1,39 @@
+"""add calendar feed token and participant timestamps
+
+Revision ID: 6e2b8d4f0a73
+Revises: 9c4e7a2d1f58
+Create Date: 2026-10-17 20:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2b8d4f0a73'
+down_revision = '9c4e7a2d1f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('calendar_token', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_user_calendar_token', ['calendar_token'], unique=True)
+
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE activity_participants SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_calendar_token')
+        batch_op.drop_column('calendar_token')
@@ -0,0 +1,33 @@
+"""index contact.last_chat
+
+Revision ID: 7a4e2c9d5b10
+Revises: 3c8d1f0a7b21
+Create Date: 2026-10-17 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e2c9d5b10'
+down_revision = '3c8d1f0a7b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_contact_last_chat'), ['last_chat'], unique=False)
+
+    # The inbox sorts on last_chat, so fill it in for existing conversations
+    op.execute(
+        "UPDATE contact SET last_chat = COALESCE("
+        "(SELECT MAX(message.timestamp) FROM message WHERE message.contact_id = contact.id), "
+        "last_chat)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_contact_last_chat'))
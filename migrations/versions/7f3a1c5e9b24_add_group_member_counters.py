@@ -0,0 +1,55 @@
+"""add group member counters
+
+Revision ID: 7f3a1c5e9b24
+Revises: 2a7c9e1d4b60
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3a1c5e9b24'
+down_revision = '2a7c9e1d4b60'
+branch_labels = None
+depends_on = None
+
+COUNTERS = ('member_count', 'youth_count', 'senior_count')
+
+
+def upgrade():
+    with op.batch_alter_table('group', schema=None) as batch_op:
+        for column in COUNTERS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=True))
+
+    # Same counts as groups.reconcile_group_counts(). full_name is not unique,
+    # so each member counts once, as the oldest account with their name.
+    op.execute("""
+        UPDATE "group" SET
+            member_count = (
+                SELECT COUNT(*) FROM group_member WHERE group_member.group_id = "group".id
+            ),
+            youth_count = (
+                SELECT COUNT(*) FROM group_member JOIN user ON user.id = (
+                    SELECT MIN(named.id) FROM user AS named WHERE named.full_name = group_member.user_name
+                )
+                WHERE group_member.group_id = "group".id AND user.age_category = 'Youth'
+            ),
+            senior_count = (
+                SELECT COUNT(*) FROM group_member JOIN user ON user.id = (
+                    SELECT MIN(named.id) FROM user AS named WHERE named.full_name = group_member.user_name
+                )
+                WHERE group_member.group_id = "group".id AND user.age_category = 'Seniors'
+            )
+    """)
+
+    with op.batch_alter_table('group', schema=None) as batch_op:
+        for column in COUNTERS:
+            batch_op.alter_column(column, existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('group', schema=None) as batch_op:
+        for column in reversed(COUNTERS):
+            batch_op.drop_column(column)
@@ -0,0 +1,43 @@
+"""unique activity participant
+
+Revision ID: 8f1c4a6d2e95
+Revises: 4b9d2e7c1a36
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1c4a6d2e95'
+down_revision = '4b9d2e7c1a36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicate joins left by double clicks, keeping the oldest row,
+    # and correct the participant counters they inflated
+    op.execute("""
+        UPDATE activity SET participants = MAX(participants - (
+            SELECT COUNT(*) - COUNT(DISTINCT participant_id)
+            FROM activity_participants
+            WHERE activity_participants.activity_id = activity.id
+        ), 0)
+        WHERE participants IS NOT NULL
+    """)
+    op.execute("""
+        DELETE FROM activity_participants
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM activity_participants GROUP BY participant_id, activity_id
+        )
+    """)
+
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_participants_participant_activity', ['participant_id', 'activity_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_participants_participant_activity')
@@ -0,0 +1,68 @@
+"""add recurring activities
+
+Revision ID: 9c4e7a2d1f58
+Revises: a3f8c5e2b716
+Create Date: 2026-10-17 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e7a2d1f58'
+down_revision = 'a3f8c5e2b716'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recurrence', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('recurrence_until', sa.Date(), nullable=True))
+
+    # app.py's db.create_all() may already have created the new table
+    if 'activity_occurrence' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'activity_occurrence',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('activity_id', sa.Integer(), nullable=False),
+            sa.Column('occurrence_date', sa.Date(), nullable=False),
+            sa.Column('cancelled', sa.Boolean(), nullable=False),
+            sa.Column('participants', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['activity_id'], ['activity.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('activity_id', 'occurrence_date', name='uq_activity_occurrence_date')
+        )
+
+    # A user joins a series once, and each single date of it at most once
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('occurrence_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_activity_participants_occurrence_id', 'activity_occurrence', ['occurrence_id'], ['id'])
+        batch_op.create_index('ix_activity_participants_occurrence_id', ['occurrence_id'], unique=False)
+        batch_op.drop_index('ix_activity_participants_participant_activity')
+        batch_op.create_index('ix_activity_participants_participant_activity', ['participant_id', 'activity_id'],
+                              unique=True, sqlite_where=sa.text('occurrence_id IS NULL'),
+                              postgresql_where=sa.text('occurrence_id IS NULL'))
+        batch_op.create_index('ix_activity_participants_participant_occurrence', ['participant_id', 'occurrence_id'],
+                              unique=True, sqlite_where=sa.text('occurrence_id IS NOT NULL'),
+                              postgresql_where=sa.text('occurrence_id IS NOT NULL'))
+
+
+def downgrade():
+    # Per-date joins have no series-level equivalent
+    op.execute("DELETE FROM activity_participants WHERE occurrence_id IS NOT NULL")
+
+    with op.batch_alter_table('activity_participants', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_participants_participant_occurrence')
+        batch_op.drop_index('ix_activity_participants_participant_activity')
+        batch_op.create_index('ix_activity_participants_participant_activity', ['participant_id', 'activity_id'], unique=True)
+        batch_op.drop_index('ix_activity_participants_occurrence_id')
+        batch_op.drop_constraint('fk_activity_participants_occurrence_id', type_='foreignkey')
+        batch_op.drop_column('occurrence_id')
+
+    op.drop_table('activity_occurrence')
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_column('recurrence_until')
+        batch_op.drop_column('recurrence')
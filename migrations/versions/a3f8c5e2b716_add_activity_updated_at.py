@@ -0,0 +1,31 @@
+"""add activity updated_at
+
+Revision ID: a3f8c5e2b716
+Revises: 5d7e1b3c9a42
+Create Date: 2026-10-17 18:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8c5e2b716'
+down_revision = '5d7e1b3c9a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE activity SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,33 @@
+"""add group feed indexes
+
+Revision ID: b5e1d7c3a902
+Revises: 4d8b2f6a1c37
+Create Date: 2026-10-17 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1d7c3a902'
+down_revision = '4d8b2f6a1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pages of a group's posts and of a post's comments
+    with op.batch_alter_table('group_post', schema=None) as batch_op:
+        batch_op.create_index('ix_group_post_group_created', ['group_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('group_comment', schema=None) as batch_op:
+        batch_op.create_index('ix_group_comment_post_created', ['post_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('group_comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_comment_post_created')
+
+    with op.batch_alter_table('group_post', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_post_group_created')
@@ -0,0 +1,46 @@
+"""add message full-text search index
+
+Revision ID: b5f0e3a91c4d
+Revises: 7a4e2c9d5b10
+Create Date: 2026-10-17 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f0e3a91c4d'
+down_revision = '7a4e2c9d5b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts "
+        "USING fts5(content, content='message', content_rowid='id')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+        "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+        "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN "
+        "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+
+    # Index the messages that already exist
+    op.execute("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS message_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS message_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS message_fts_ai")
+    op.execute("DROP TABLE IF EXISTS message_fts")
@@ -0,0 +1,30 @@
+"""add explore facet indexes
+
+Revision ID: c6e2a9f4d817
+Revises: 8f1c4a6d2e95
+Create Date: 2026-10-17 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2a9f4d817'
+down_revision = '8f1c4a6d2e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_type_date_time', ['type', 'date', 'time'], unique=False)
+        batch_op.create_index('ix_activity_energy_date_time', ['energy', 'date', 'time'], unique=False)
+        batch_op.create_index('ix_activity_format_type_date_time', ['format_type', 'date', 'time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_format_type_date_time')
+        batch_op.drop_index('ix_activity_energy_date_time')
+        batch_op.drop_index('ix_activity_type_date_time')
@@ -0,0 +1,41 @@
+"""add contact unread_count
+
+Revision ID: d2a6c8e4f713
+Revises: b5f0e3a91c4d
+Create Date: 2026-10-17 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c8e4f713'
+down_revision = 'b5f0e3a91c4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_contact_status_last_chat', ['message_status', 'last_chat'], unique=False)
+
+    unread = (
+        "(SELECT COUNT(*) FROM message WHERE message.contact_id = contact.id "
+        "AND (message.status IS NULL OR message.status != 'Read') "
+        # Messages sent from a ShareJoy account are the user's own
+        "AND NOT EXISTS (SELECT 1 FROM user WHERE user.full_name = message.username))"
+    )
+    # Same status rule as messages.inbox_status(): archived contacts stay archived
+    op.execute(
+        f"UPDATE contact SET unread_count = {unread}, message_status = CASE "
+        f"WHEN message_status = 'Archived' THEN message_status "
+        f"WHEN {unread} > 0 THEN 'Unread' ELSE 'Read' END"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.drop_index('ix_contact_status_last_chat')
+        batch_op.drop_column('unread_count')
@@ -0,0 +1,43 @@
+"""add group post likes
+
+Revision ID: e3c9a5f1b806
+Revises: b5e1d7c3a902
+Create Date: 2026-10-17 23:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3c9a5f1b806'
+down_revision = 'b5e1d7c3a902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py's db.create_all() may already have created the new table
+    if 'group_post_like' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'group_post_like',
+            sa.Column('post_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['post_id'], ['group_post.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('post_id', 'user_id')
+        )
+
+    # Earlier likes were not recorded per user; their counts are kept as they are
+    op.execute("UPDATE group_post SET likes = 0 WHERE likes IS NULL")
+
+    with op.batch_alter_table('group_post', schema=None) as batch_op:
+        batch_op.alter_column('likes', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('group_post', schema=None) as batch_op:
+        batch_op.alter_column('likes', existing_type=sa.Integer(), nullable=True)
+
+    op.drop_table('group_post_like')
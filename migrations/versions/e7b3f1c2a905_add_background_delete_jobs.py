@@ -0,0 +1,77 @@
+"""add background delete jobs
+
+Revision ID: e7b3f1c2a905
+Revises: d2a6c8e4f713
+Create Date: 2026-10-17 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f1c2a905'
+down_revision = 'd2a6c8e4f713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py's db.create_all() may already have created the new table
+    if 'delete_job' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'delete_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('contact_id', sa.Integer(), nullable=False),
+            sa.Column('through_message_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('deleted', sa.Integer(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('delete_job', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_delete_job_contact_id'), ['contact_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_delete_job_status'), ['status'], unique=False)
+
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('cleared_through_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_contact_deleted_at'), ['deleted_at'], unique=False)
+
+    # Message ids must never be reused once deleted, or a new message could
+    # fall under a contact's cleared_through_id: rebuild with AUTOINCREMENT.
+    with op.batch_alter_table('message', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+    # Dropping the old table dropped its full-text search triggers
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+        "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+        "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN "
+        "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('contact', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_contact_deleted_at'))
+        batch_op.drop_column('cleared_through_id')
+        batch_op.drop_column('deleted_at')
+
+    with op.batch_alter_table('delete_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_delete_job_status'))
+        batch_op.drop_index(batch_op.f('ix_delete_job_contact_id'))
+
+    op.drop_table('delete_job')
@@ -0,0 +1,29 @@
+"""add delete job heartbeat
+
+Revision ID: f1a7c3e9d254
+Revises: e3c9a5f1b806
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a7c3e9d254'
+down_revision = 'e3c9a5f1b806'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py's db.create_all() creates delete_job with the column when the table is new
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('delete_job')}
+    if 'heartbeat_at' not in columns:
+        with op.batch_alter_table('delete_job', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('delete_job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
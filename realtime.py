@@ -0,0 +1,99 @@
+"""
+Real-time delivery of new chat messages over Server-Sent Events (SSE).
+
+Each stream polls the database for rows newer than the last id it sent, so
+messages written by any worker process are always delivered. A broker only
+decides how quickly a stream wakes up: the default LocalBroker wakes streams
+in this process as soon as a message is published here, and every stream
+still re-checks the database every SSE_POLL_INTERVAL seconds to pick up
+messages written by other processes.
+
+A different broker (for example one backed by Redis pub/sub) can be plugged
+in with init_realtime(app, broker=...) as long as it offers the same
+publish/version/wait methods.
+"""
+
+import json
+import threading
+
+from flask import current_app, request
+
+from extensions import db
+
+SSE_POLL_INTERVAL = 15  # seconds between database checks without a local publish
+
+
+class LocalBroker:
+    """In-process pub/sub: each channel has a version that publish() bumps."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+
+    def publish(self, channel):
+        with self._condition:
+            self._versions[channel] = self._versions.get(channel, 0) + 1
+            self._condition.notify_all()
+
+    def version(self, channel):
+        with self._condition:
+            return self._versions.get(channel, 0)
+
+    def wait(self, channel, version, timeout):
+        """Block until channel moves past version or timeout; return the new version."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(channel, 0) != version, timeout)
+            return self._versions.get(channel, 0)
+
+
+def init_realtime(app, broker=None):
+    app.extensions['chat_broker'] = broker or LocalBroker()
+
+
+def get_broker():
+    return current_app.extensions['chat_broker']
+
+
+def publish(channel):
+    """Tell streams on this channel that new rows were committed."""
+    get_broker().publish(channel)
+
+
+def last_event_id(default):
+    """Where a (re)connecting client left off: Last-Event-ID, ?after=, else default."""
+    value = request.headers.get("Last-Event-ID") or request.args.get("after")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def sse_event(event_id, data, event="message"):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_new_rows(channel, last_id, fetch_after, serialize, poll_interval=SSE_POLL_INTERVAL):
+    """Generate SSE events for rows with an id greater than last_id.
+
+    fetch_after(last_id) returns new rows ordered by id; serialize(row) turns
+    one row into the event payload. Must run inside stream_with_context.
+    """
+    broker = get_broker()
+    version = broker.version(channel)
+
+    yield "retry: 3000\n\n"
+
+    while True:
+        rows = fetch_after(last_id)
+        for row in rows:
+            last_id = row.id
+            yield sse_event(last_id, serialize(row))
+
+        # End the read transaction so the next poll sees newly committed rows
+        db.session.close()
+
+        new_version = broker.wait(channel, version, poll_interval)
+        if new_version == version:
+            # Timed out: keep the connection alive and re-check the database
+            yield ": keep-alive\n\n"
+        version = new_version
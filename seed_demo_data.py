@@ -4,7 +4,8 @@ This script ensures that two demo groups persist when the application is hosted.
 """
 
 from extensions import db
-from groups import Group, GroupMember, GroupPost, GroupComment, GroupChatMessage
+from groups import Group, GroupMember, GroupPost, GroupComment, GroupChatMessage, reconcile_group_counts
+from tags import set_group_tags
 from datetime import datetime, timedelta
 
 
@@ -50,7 +51,6 @@ def seed_demo_groups():
         description="Join us for an afternoon of classic and modern tabletop games! From strategy games to party favorites, we have something for everyone. Friendly competition and laughter guaranteed. All skill levels welcome - whether you're a seasoned player or just starting out!",
         category="Social",
         youth_percentage=75,
-        tags="games,social,fun,boardgames,cards,puzzles",
         current_participants=8,
         max_participants=40,
         privacy="Public",
@@ -62,6 +62,7 @@ def seed_demo_groups():
     )
     db.session.add(group1)
     db.session.flush()  # Get the ID without committing
+    set_group_tags(group1, "games,social,fun,boardgames,cards,puzzles")
 
     # Add demo members for Board Games group
     demo_members_group1 = [
@@ -214,7 +215,6 @@ def seed_demo_groups():
         description="Gentle walks in neighbourhood parks with relaxed conversations and shared moments in nature. Perfect for all fitness levels. We explore local trails, enjoy fresh air, and build connections through meaningful conversations. Join us for mindful walks and peaceful moments in green spaces.",
         category="Wellness",
         youth_percentage=25,
-        tags="wellness,nature,walking,community,outdoor,health",
         current_participants=10,
         max_participants=40,
         privacy="Public",
@@ -226,6 +226,7 @@ def seed_demo_groups():
     )
     db.session.add(group2)
     db.session.flush()
+    set_group_tags(group2, "wellness,nature,walking,community,outdoor,health")
 
     # Add demo members for Walk and Talk group
     demo_members_group2 = [
@@ -406,6 +407,10 @@ def seed_demo_groups():
 
     demo_groups.append(group2)
 
+    # Count the demo members into the group counters
+    db.session.flush()
+    reconcile_group_counts([group.id for group in demo_groups])
+
     # Commit all changes
     try:
         db.session.commit()
@@ -0,0 +1,122 @@
+"""
+Tags shared by activities and groups.
+
+Each distinct tag is one row in `tag`, matched case-insensitively through
+its unique slug. activity_tag and group_tag link tags to their owners in
+the order they were entered; their (tag_id, owner) indexes are the inverted
+index used for exact tag filters and search.
+"""
+
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+MAX_TAG_LENGTH = 50
+
+
+class Tag(db.Model):
+    __tablename__ = "tag"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(MAX_TAG_LENGTH), nullable=False)  # as first entered
+    slug = db.Column(db.String(MAX_TAG_LENGTH), nullable=False, unique=True)  # lowercased for matching
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+
+activity_tag = db.Table(
+    "activity_tag",
+    db.Column("activity_id", db.Integer, db.ForeignKey("activity.id"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id"), primary_key=True),
+    db.Column("position", db.Integer, nullable=False, default=0),
+    db.Index("ix_activity_tag_tag_id", "tag_id", "activity_id"),
+)
+
+group_tag = db.Table(
+    "group_tag",
+    db.Column("group_id", db.Integer, db.ForeignKey("group.id"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id"), primary_key=True),
+    db.Column("position", db.Integer, nullable=False, default=0),
+    db.Index("ix_group_tag_tag_id", "tag_id", "group_id"),
+)
+
+
+def clean_tag(raw):
+    return " ".join(raw.split()).lstrip("#")[:MAX_TAG_LENGTH]
+
+
+def tag_slug(name):
+    return name.lower()
+
+
+def split_tags(value):
+    """Split a comma-separated tag string into clean names, dropping repeats."""
+    names = []
+    seen = set()
+    for raw in (value or "").split(","):
+        name = clean_tag(raw)
+        if name and tag_slug(name) not in seen:
+            seen.add(tag_slug(name))
+            names.append(name)
+    return names
+
+
+def get_or_create_tags(names):
+    """Tag rows for names, in the same order, creating any that are new."""
+    slugs = [tag_slug(name) for name in names]
+    tags = {tag.slug: tag for tag in Tag.query.filter(Tag.slug.in_(slugs))} if slugs else {}
+
+    for name, slug in zip(names, slugs):
+        if slug in tags:
+            continue
+        try:
+            with db.session.begin_nested():
+                tag = Tag(name=name, slug=slug)
+                db.session.add(tag)
+        except IntegrityError:
+            # Created by a concurrent request
+            tag = Tag.query.filter_by(slug=slug).one()
+        tags[slug] = tag
+
+    return [tags[slug] for slug in slugs]
+
+
+def _replace_links(link_table, owner_column, owner_id, value):
+    tags = get_or_create_tags(split_tags(value))
+    db.session.execute(link_table.delete().where(link_table.c[owner_column] == owner_id))
+    if tags:
+        db.session.execute(link_table.insert(), [
+            {owner_column: owner_id, "tag_id": tag.id, "position": position}
+            for position, tag in enumerate(tags)
+        ])
+
+
+def set_activity_tags(activity, value):
+    """Replace an activity's tags with those in a comma-separated string.
+
+    The activity must have an id (flush it first). The caller commits.
+    """
+    _replace_links(activity_tag, "activity_id", activity.id, value)
+    db.session.expire(activity, ["tags"])
+    activity.updated_at = datetime.utcnow()
+
+
+def set_group_tags(group, value):
+    """Replace a group's tags with those in a comma-separated string.
+
+    The group must have an id (flush it first). The caller commits.
+    """
+    _replace_links(group_tag, "group_id", group.id, value)
+    db.session.expire(group, ["tags"])
+
+
+def tagged(link_table, owner_column, owner_id_column, name):
+    """Filter for owners carrying exactly this tag (case-insensitive)."""
+    return owner_id_column.in_(
+        db.select(link_table.c[owner_column])
+        .join(Tag, Tag.id == link_table.c.tag_id)
+        .where(Tag.slug == tag_slug(clean_tag(name)))
+    )
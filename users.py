@@ -37,6 +37,9 @@ class User(db.Model):
     first_activity_completed = db.Column(db.Boolean, default=False)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Secret in the schedule's .ics feed URL; None while the feed is off
+    calendar_token = db.Column(db.String(64), unique=True, index=True, nullable=True)
     
     def set_password(self, password):
         """Hash and set the password"""